@@ -1,26 +1,168 @@
+import time
+STARTUP_T0 = time.perf_counter()
+
 import kivy
 import os
+import copy
+import csv
+import functools
+import gzip
+import hashlib
+import hmac
+import io
 import json
-from datetime import datetime
+import math
+import mmap
+import struct
+import uuid
+import urllib.parse
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from operator import itemgetter
 
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.uix.boxlayout import BoxLayout
-from kivy.uix.gridlayout import GridLayout
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
 from kivy.uix.button import Button
-from kivy.uix.popup import Popup
+from kivy.uix.widget import Widget
 from kivy.uix.screenmanager import ScreenManager, Screen
-from kivy.uix.spinner import Spinner
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.factory import Factory
+from kivy.logger import Logger
 from kivy.graphics import Color, Rectangle, RoundedRectangle
 
+# ═══════════════════════════════════════════════════════════
+#  TRASE — замеры горячих путей (включается SPORTA_PROFILE=1)
+# ═══════════════════════════════════════════════════════════
+# @traced и TRACE.span() пишут события в формате Chrome trace
+# (chrome://tracing, ui.perfetto.dev): длительность, поток и сколько
+# виджетов создано за вызов. Плюс время каждого кадра по Clock.
+# Без SPORTA_PROFILE декоратор возвращает функцию как есть.
+
+TRACE_LIMIT = 50000     # событий в памяти, старые вытесняются
+TRACE_DIR = "traces"
+
+
+class Tracer:
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.events = deque(maxlen=TRACE_LIMIT)
+        self.recent = deque(maxlen=12)     # (имя, мс, виджетов) для оверлея
+        self.frames = deque(maxlen=120)    # длительности последних кадров, с
+        self.widgets = 0                   # создано виджетов с запуска
+        self._threads = set()
+
+    def _ts(self, t):
+        return (t - STARTUP_T0) * 1e6     # микросекунды от старта
+
+    def _tid(self):
+        thread = threading.current_thread()
+        if thread.ident not in self._threads:
+            self._threads.add(thread.ident)
+            self.events.append({"name": "thread_name", "ph": "M", "pid": 1,
+                                "tid": thread.ident, "args": {"name": thread.name}})
+        return thread.ident
+
+    @contextmanager
+    def span(self, name, **args):
+        if not self.enabled:
+            yield
+            return
+        start, widgets = time.perf_counter(), self.widgets
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            created = self.widgets - widgets
+            self.events.append({"name": name, "ph": "X", "pid": 1, "tid": self._tid(),
+                                "ts": self._ts(start), "dur": (end - start) * 1e6,
+                                "args": dict(args, widgets=created)})
+            self.recent.append((name, (end - start) * 1000, created))
+
+    def traced(self, fn):
+        if not self.enabled:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.span(fn.__qualname__):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def install(self):
+        # Счётчик виджетов и время кадра — только при включённой трассе
+        from kivy.uix.widget import Widget
+        init = Widget.__init__
+
+        def counting_init(widget, **kwargs):
+            self.widgets += 1
+            init(widget, **kwargs)
+        Widget.__init__ = counting_init
+        Clock.schedule_interval(self._frame, 0)
+
+    def _frame(self, dt):
+        self.frames.append(dt)
+        self.events.append({"name": "frame", "ph": "C", "pid": 1, "tid": self._tid(),
+                            "ts": self._ts(time.perf_counter()),
+                            "args": {"ms": dt * 1000}})
+
+    def export(self, path=None):
+        if path is None:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            path = os.path.join(TRACE_DIR, f"trace-{datetime.now():%Y%m%d-%H%M%S}.json")
+        with open(path, "wb") as f:
+            f.write(dump_json({"traceEvents": list(self.events),
+                               "displayTimeUnit": "ms"}))
+        return path
+
+
+TRACE = Tracer(bool(os.environ.get("SPORTA_PROFILE")))
+traced = TRACE.traced
+
 # ═══════════════════════════════════════════════════════════
 #  PALĪGFUNKCIJAS — работа с файлами вместо БД
 # ═══════════════════════════════════════════════════════════
 
 DATA_DIR = "user_data"
 
+# orjson (если установлен) в разы быстрее stdlib json на больших профилях.
+# По умолчанию файлы пишутся компактно; SPORTA_PRETTY_JSON=1 включает
+# читаемый формат с отступами (для ручной правки и отладки).
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+PRETTY_JSON = bool(os.environ.get("SPORTA_PRETTY_JSON"))
+
+def dump_json(obj, pretty=False):
+    # -> bytes в UTF-8
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        text = json.dumps(obj, ensure_ascii=False, indent=2)
+    else:
+        text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    return text.encode("utf-8")
+
+def load_json(raw):
+    # bytes или str; ошибки формата — ValueError в обоих вариантах
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
 def ensure_dir():
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
@@ -28,39 +170,2758 @@ def ensure_dir():
 def get_user_file(username):
     return os.path.join(DATA_DIR, f"{username}.json")
 
+def list_usernames():
+    # Имена по файлам профилей и логов событий в DATA_DIR
+    if not os.path.isdir(DATA_DIR):
+        return []
+    names = set()
+    for fn in os.listdir(DATA_DIR):
+        for suffix in (".events.jsonl", ".json"):
+            if fn.endswith(suffix):
+                names.add(fn[:-len(suffix)])
+                break
+    return sorted(names)
+
+@traced
 def load_user_data(username):
     path = get_user_file(username)
     if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(path, "rb") as f:
+            return load_profile(load_json(f.read()))
     return None
 
+@traced
 def save_user_data(username, data):
     ensure_dir()
-    with open(get_user_file(username), "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-def create_new_user(username, email, password):
+    write_atomic(get_user_file(username), dump_json(dump_profile(data), pretty=PRETTY_JSON))
+
+def write_atomic(path, raw):
+    # Пишем во временный файл и подменяем целиком — обрыв записи
+    # не может оставить обрезанный JSON: на диске либо старая версия,
+    # либо новая. fsync каталога — чтобы сама подмена пережила сбой питания.
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if hasattr(os, "O_DIRECTORY"):   # на Windows каталог так не открыть
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+def recover_data_dir():
+    # После сбоя посреди write_atomic остаётся <файл>.tmp, а сам файл —
+    # целая прежняя версия. Недописанные строки журналов событий
+    # отрезает EventLogBackend.load при первом чтении профиля.
+    if not os.path.isdir(DATA_DIR):
+        return
+    for fn in os.listdir(DATA_DIR):
+        if fn.endswith(".tmp"):
+            Logger.warning("Storage: removing unfinished write %s", fn)
+            os.remove(os.path.join(DATA_DIR, fn))
+
+def create_new_user(store, username, email, password_hash):
+    # Пароль — уже посчитанный hash_password(): KDF медленный, его место
+    # в потоке ввода-вывода, а не здесь
     data = {
         "username": username,
         "email": email,
-        "password": password,
+        "password": password_hash,
         "punkti": 0,
         "izaicinajumi": [],
         "rezultati": [],
         "sasniegumi": []
     }
-    save_user_data(username, data)
-    return data
+    return store.create(username, data)
 
-def add_achievement(data, title, description, punkti):
-    data["sasniegumi"].append({
+def add_achievement(store, username, title, description, punkti, **extra):
+    store.add(username, "achievement_awarded", {
         "title": title,
         "description": description,
         "punkti": punkti,
-        "datums": datetime.now().strftime("%d.%m.%Y %H:%M")
+        "datums": datetime.now().strftime("%d.%m.%Y %H:%M"),
+        **extra
     })
-    data["punkti"] += punkti
+
+def award_challenges(store, username):
+    # Выполненные, но ещё не награждённые вызовы; награда помечается
+    # ключом вызова, так что второй раз не выдаётся. Из потока
+    # ввода-вывода или вне приложения. -> названия награждённых вызовов
+    info = store.summary(username)
+    if not info:
+        return []
+    challenges = info["stats"]["challenges"]
+    titles = []
+    for key, title in challenges["completed"].items():
+        if key not in challenges["awarded"]:
+            add_achievement(store, username, "Izaicinājums izpildīts!", title,
+                            CHALLENGE_REWARD, challenge=key)
+            titles.append(title)
+    return titles
+
+
+# ═══════════════════════════════════════════════════════════
+#  MODEĻI — типизированные записи вместо словарей
+# ═══════════════════════════════════════════════════════════
+# В памяти записи хранятся как компактные объекты со __slots__:
+# числа — числами, даты — datetime. На диске формат прежний (строки),
+# перевод туда и обратно — from_dict / to_dict.
+
+DATETIME_FMT = "%d.%m.%Y %H:%M"
+DATE_FMT = "%d.%m.%Y"
+
+# Версия формата профиля на диске; load_profile переводит любую
+# известную версию в модели
+PROFILE_FORMAT = 1
+
+
+def parse_number(text):
+    # "inf" и "nan" float() принимает, но JSON их не хранит (orjson пишет
+    # null) — для суммы и рекорда это не число
+    try:
+        value = float(text)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+def format_number(value):
+    if value is None:
+        return ""
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(value)
+
+def parse_time(text, fmt):
+    # Форматы профиля разбираются срезами: strptime в разы медленнее,
+    # а на загрузке и импорте больших профилей он занимал основное время
+    try:
+        if fmt == DATETIME_FMT and len(text) == 16 and text[13] == ":":
+            return datetime(*_dmy(text), int(text[11:13]), int(text[14:16]))
+        if fmt == DATE_FMT and len(text) == 10:
+            return datetime(*_dmy(text))
+        return datetime.strptime(text, fmt)
+    except (TypeError, ValueError):
+        return None
+
+def _dmy(text):
+    # "dd.mm.yyyy..." -> (год, месяц, день); иначе ValueError
+    d, m, y = text[:2], text[3:5], text[6:10]
+    if text[2] != "." or text[5] != "." or not (d + m + y).isdigit():
+        raise ValueError(text)
+    return int(y), int(m), int(d)
+
+
+class Record:
+    # Основа моделей: isinstance(x, Record) отличает запись от словаря
+    __slots__ = ()
+    FIELDS = ()
+
+    @staticmethod
+    def _extra(d, fields, bad=()):
+        # Неизвестные поля (id и т.п.) и значения, которые не удалось
+        # разобрать, сохраняются как есть и возвращаются в to_dict
+        extra = {k: v for k, v in d.items() if k not in fields}
+        for key in bad:
+            if d.get(key) not in (None, ""):
+                extra[key] = d[key]
+        return extra or None
+
+
+@dataclass(slots=True)
+class Result(Record):
+    sport: str
+    value: float
+    unit: str = ""
+    note: str = ""
+    datums: datetime = None
+    extra: dict = None
+
+    FIELDS = ("sport", "value", "unit", "note", "datums")
+
+    @classmethod
+    def from_dict(cls, d):
+        value = parse_number(d.get("value"))
+        datums = parse_time(d.get("datums"), DATETIME_FMT)
+        bad = [k for k, v in (("value", value), ("datums", datums)) if v is None]
+        return cls(d.get("sport", ""), value, d.get("unit", ""), d.get("note", ""),
+                   datums, Record._extra(d, cls.FIELDS, bad))
+
+    def to_dict(self):
+        d = {
+            "sport":  self.sport,
+            "value":  format_number(self.value),
+            "unit":   self.unit,
+            "note":   self.note,
+            "datums": self.datums.strftime(DATETIME_FMT) if self.datums else "",
+        }
+        if self.extra:
+            d.update(self.extra)
+        return d
+
+
+@dataclass(slots=True)
+class Challenge(Record):
+    title: str
+    sport: str
+    description: str = ""
+    target: float = None
+    unit: str = ""
+    deadline: datetime = None
+    datums: datetime = None
+    extra: dict = None
+
+    FIELDS = ("title", "sport", "description", "target", "unit", "deadline", "datums")
+
+    @classmethod
+    def from_dict(cls, d):
+        target = parse_number(d.get("target"))
+        deadline = parse_time(d.get("deadline"), DATE_FMT)
+        datums = parse_time(d.get("datums"), DATE_FMT)
+        bad = [k for k, v in (("target", target), ("deadline", deadline),
+                              ("datums", datums)) if v is None]
+        return cls(d.get("title", ""), d.get("sport", ""), d.get("description", ""),
+                   target, d.get("unit", ""), deadline, datums,
+                   Record._extra(d, cls.FIELDS, bad))
+
+    def to_dict(self):
+        d = {
+            "title":       self.title,
+            "sport":       self.sport,
+            "description": self.description,
+            "target":      format_number(self.target),
+            "unit":        self.unit,
+            "deadline":    self.deadline.strftime(DATE_FMT) if self.deadline else "",
+            "datums":      self.datums.strftime(DATE_FMT) if self.datums else "",
+        }
+        if self.extra:
+            d.update(self.extra)
+        return d
+
+
+@dataclass(slots=True)
+class Achievement(Record):
+    title: str
+    description: str = ""
+    punkti: int = 0
+    datums: datetime = None
+    extra: dict = None
+
+    FIELDS = ("title", "description", "punkti", "datums")
+
+    @classmethod
+    def from_dict(cls, d):
+        datums = parse_time(d.get("datums"), DATETIME_FMT)
+        return cls(d.get("title", ""), d.get("description", ""), int(d.get("punkti", 0)),
+                   datums, Record._extra(d, cls.FIELDS, [] if datums else ["datums"]))
+
+    def to_dict(self):
+        d = {
+            "title":       self.title,
+            "description": self.description,
+            "punkti":      self.punkti,
+            "datums":      self.datums.strftime(DATETIME_FMT) if self.datums else "",
+        }
+        if self.extra:
+            d.update(self.extra)
+        return d
+
+
+MODELS = {
+    "izaicinajumi": Challenge,
+    "rezultati":    Result,
+    "sasniegumi":   Achievement,
+}
+
+def as_model(key, record):
+    if isinstance(record, Record):
+        return record
+    return MODELS[key].from_dict(record)
+
+def _profile_from_v1(data):
+    for key, model in MODELS.items():
+        data[key] = [model.from_dict(r) for r in data.get(key, [])]
+    return data
+
+PROFILE_CONVERTERS = {
+    1: _profile_from_v1,
+}
+
+def load_profile(data):
+    # Словарь, прочитанный с диска -> профиль с моделями
+    if data is None:
+        return None
+    version = data.pop("format", 1)
+    return PROFILE_CONVERTERS[version](data)
+
+def dump_profile(data):
+    # Профиль с моделями -> словарь для записи на диск
+    out = {k: v for k, v in data.items() if k not in MODELS}
+    out["format"] = PROFILE_FORMAT
+    for key in MODELS:
+        out[key] = [r.to_dict() if isinstance(r, Record) else r
+                    for r in data.get(key, [])]
+    return out
+
+
+# ═══════════════════════════════════════════════════════════
+#  NOTIKUMI — каждое изменение профиля это событие
+# ═══════════════════════════════════════════════════════════
+
+EVENT_LISTS = {
+    "challenge_created":   "izaicinajumi",
+    "result_added":        "rezultati",
+    "achievement_awarded": "sasniegumi",
+}
+
+def apply_event(data, event):
+    # Возвращает добавленную запись (модель), если событие её добавляет
+    kind, record = event["type"], event["data"]
+    if kind == "user_created":
+        data.update(load_profile(copy.deepcopy(record)))
+        data["stats"] = build_stats(data)
+    elif kind == "user_updated":
+        data.update(record)
+    elif kind == "records_archived":
+        # первые count записей списка теперь в архиве (см. archive_old)
+        del data[record["key"]][:record["count"]]
+        update_stats(data["stats"], kind, record)
+    else:
+        key = EVENT_LISTS[kind]
+        model = as_model(key, record)
+        data[key].append(model)
+        if kind == "achievement_awarded":
+            data["punkti"] += model.punkti
+        if "stats" not in data:
+            data["stats"] = build_stats(data)
+        else:
+            update_stats(data["stats"], kind, model)
+        return model
+
+
+# ═══════════════════════════════════════════════════════════
+#  STATISTIKA — агрегаты, которые обновляются при каждой записи
+# ═══════════════════════════════════════════════════════════
+# Профиль хранит готовый блок "stats", поэтому экранам не нужно
+# пересчитывать историю: счётчики, суммы и рекорды по спорту, серии,
+# прогресс вызовов.
+#
+# Вызовы с целью индексируются по виду спорта, внутри — по термину:
+# open[sport] = [[день термина, день создания, ключ, цель, название], ...].
+# Новый результат проходит только по вызовам своего вида, термин которых
+# ещё не прошёл к его дате, и прибавляет значение к их сумме done[ключ].
+# Достигшие цели переходят в completed, награда — award_challenges.
+
+CHALLENGE_REWARD = 50   # очков за выполненный вызов
+
+
+def new_stats():
+    return {
+        "izaicinajumi": 0,
+        "rezultati":    0,
+        "sasniegumi":   0,
+        "sports":       {},   # sports -> {"count", "sum", "best"}
+        "streak":       {"current": 0, "best": 0, "last_day": None},
+        "challenges":   {"open": {}, "done": {}, "completed": {}, "awarded": {}},
+        "badges":       {},   # ключ выданного правила -> True
+        "archived":     {},   # список -> сколько первых записей в архиве
+    }
+
+def challenge_key(ch):
+    # id есть у всех вызовов, созданных после появления синхронизации
+    extra = ch.extra or {}
+    return extra.get("id") or f"{ch.title}|{ch.sport}|{ch.to_dict()['datums']}"
+
+def _track_challenge(challenges, ch):
+    if not ch.sport or not ch.target or ch.target <= 0:
+        return
+    key = challenge_key(ch)
+    start = ch.datums.toordinal() if ch.datums else 0
+    end = ch.deadline.toordinal() if ch.deadline else date.max.toordinal()
+    insort(challenges["open"].setdefault(ch.sport, []),
+           [end, start, key, ch.target, ch.title])
+    challenges["done"][key] = 0.0
+
+def _count_result(challenges, record):
+    if record.value is None or record.datums is None:
+        return
+    entries = challenges["open"].get(record.sport)
+    if not entries:
+        return
+    day = record.datums.toordinal()
+    # Термин раньше дня результата — такие вызовы пропускаются бинпоиском
+    finished = []
+    for entry in entries[bisect_left(entries, [day]):]:
+        end, start, key, target, title = entry
+        if start > day:
+            continue
+        challenges["done"][key] += record.value
+        if challenges["done"][key] >= target:
+            challenges["completed"][key] = title
+            finished.append(entry)
+    for entry in finished:
+        entries.remove(entry)
+
+def update_stats(stats, kind, record):
+    # record — модель (Result/Challenge/Achievement)
+    if kind == "records_archived":
+        archived = stats["archived"]
+        archived[record["key"]] = archived.get(record["key"], 0) + record["count"]
+        return
+    if kind not in EVENT_LISTS:
+        return
+    key = EVENT_LISTS[kind]
+    stats[key] = stats.get(key, 0) + 1
+    challenges = stats.get("challenges")
+    if kind == "challenge_created":
+        if challenges is not None:
+            _track_challenge(challenges, record)
+        return
+    if kind == "achievement_awarded":
+        extra = record.extra or {}
+        key = extra.get("challenge")
+        if challenges is not None and key:
+            challenges["awarded"][key] = True
+        if extra.get("rule") and "badges" in stats:
+            stats["badges"][extra["rule"]] = True
+        return
+    if challenges is not None:
+        _count_result(challenges, record)
+
+    sport = stats["sports"].setdefault(record.sport,
+                                       {"count": 0, "sum": 0.0, "best": None})
+    sport["count"] += 1
+    value = record.value
+    if value is not None:
+        # null вместо суммы — stats, записанные до проверки на inf/nan
+        sport["sum"] = (sport["sum"] or 0.0) + value
+        if sport["best"] is None or value > sport["best"]:
+            sport["best"] = value
+
+    # Серия — сколько дней подряд есть хотя бы один результат
+    if record.datums is None:
+        return
+    day = record.datums.date()
+    streak = stats["streak"]
+    last = streak["last_day"] and datetime.fromisoformat(streak["last_day"]).date()
+    if last and day <= last:
+        return
+    if last and (day - last).days == 1:
+        streak["current"] += 1
+    else:
+        streak["current"] = 1
+    streak["best"] = max(streak["best"], streak["current"])
+    streak["last_day"] = day.isoformat()
+
+def current_streak(streak, today=None):
+    # stats хранит серию на день последнего результата; если с тех пор
+    # пропущен хотя бы день, серия уже прервалась
+    last = streak["last_day"]
+    today = today or date.today()
+    if not last or (today - date.fromisoformat(last)).days > 1:
+        return 0
+    return streak["current"]
+
+def build_stats(data):
+    # Полный пересчёт — только для профилей, сохранённых до появления stats
+    stats = new_stats()
+    for kind, key in EVENT_LISTS.items():
+        for record in data.get(key, []):
+            update_stats(stats, kind, as_model(key, record))
+    return stats
+
+def stats_current(stats):
+    # Блок stats сохранён до появления какой-то из его частей — пересобрать
+    return stats is not None and not new_stats().keys() - stats.keys()
+
+def ensure_stats(data):
+    if data is not None and not stats_current(data.get("stats")):
+        data["stats"] = build_stats(data)
+    elif data is not None:
+        upgrade_stats(data["stats"])
+    return data
+
+def upgrade_stats(stats):
+    # Старые форматы частей stats, которые переводятся на месте: полная
+    # пересборка потеряла бы то, что уже ушло в архив
+    challenges = stats["challenges"]
+    if isinstance(challenges["awarded"], list):
+        challenges["awarded"] = dict.fromkeys(challenges["awarded"], True)
+    return stats
+
+
+# ═══════════════════════════════════════════════════════════
+#  SASNIEGUMU NOTEIKUMI — достижения по правилам
+# ═══════════════════════════════════════════════════════════
+# Правило: на событие какого типа смотреть, какой счётчик из stats
+# сравнивать и с каким порогом. compile_rules раскладывает правила в
+# таблицу тип события -> счётчик -> пороги по возрастанию, поэтому на
+# событие проверяются только его счётчики, а не вся история и не все
+# правила. Выданные правила помечаются в stats["badges"] ключом из
+# записи достижения (поле "rule") и второй раз не выдаются.
+
+LEVELS = (
+    ("Iesācējs",  0),
+    ("Sportists", 100),
+    ("Meistars",  300),
+    ("Čempions",  600),
+)
+
+def level_for(punkti):
+    # -> (уровень, следующий уровень или None, его порог)
+    i = bisect_right([threshold for _, threshold in LEVELS], punkti) - 1
+    name = LEVELS[max(i, 0)][0]
+    if i + 1 < len(LEVELS):
+        return name, LEVELS[i + 1][0], LEVELS[i + 1][1]
+    return name, None, None
+
+
+@dataclass(slots=True, frozen=True)
+class Rule:
+    key: str
+    on: str             # тип события
+    metric: str         # счётчик из METRICS
+    threshold: float
+    title: str
+    description: str
+    punkti: int = 0
+
+
+# Счётчик -> значение по сводке профиля (summary); для счётчиков по
+# виду спорта — ещё и по названию вида, ключ правила тогда key:вид
+METRICS = {
+    "rezultati":    lambda info, sport: info["stats"]["rezultati"],
+    "izaicinajumi": lambda info, sport: info["stats"]["izaicinajumi"],
+    "streak":       lambda info, sport: current_streak(info["stats"]["streak"]),
+    "punkti":       lambda info, sport: info["punkti"],
+    "sport_count":  lambda info, sport: info["stats"]["sports"][sport]["count"],
+    "sport_sum":    lambda info, sport: info["stats"]["sports"][sport]["sum"] or 0.0,
+}
+SPORT_METRICS = {"sport_count", "sport_sum"}
+
+ACHIEVEMENT_RULES = [
+    *(Rule(f"rezultati-{n}", "result_added", "rezultati", n,
+           f"{n} rezultāti!", f"Reģistrēti {n} rezultāti", p)
+      for n, p in ((10, 20), (50, 50), (100, 100), (500, 250), (1000, 500))),
+    *(Rule(f"izaicinajumi-{n}", "challenge_created", "izaicinajumi", n,
+           f"{n} izaicinājumi!", f"Izveidoti {n} izaicinājumi", p)
+      for n, p in ((5, 30), (25, 100))),
+    *(Rule(f"serija-{n}", "result_added", "streak", n,
+           f"{n} dienu sērija!", f"Rezultāti {n} dienas pēc kārtas", p)
+      for n, p in ((3, 15), (7, 50), (14, 100), (30, 250), (100, 1000))),
+    *(Rule(f"sports-{n}", "result_added", "sport_count", n,
+           "{sport}: {n} reizes!", "{n} rezultāti sporta veidā {sport}", p)
+      for n, p in ((10, 25), (100, 150))),
+    *(Rule(f"apjoms-{n}", "result_added", "sport_sum", n,
+           "{sport}: kopā {n}!", "Rezultātu summa sporta veidā {sport} sasniedz {n}", p)
+      for n, p in ((100, 50), (1000, 300))),
+    *(Rule(f"limenis-{threshold}", "achievement_awarded", "punkti", threshold,
+           f"Jauns līmenis: {name}!", f"Sasniegti {threshold} punkti", 0)
+      for name, threshold in LEVELS[1:]),
+]
+
+
+def compile_rules(rules):
+    # -> {тип события: {счётчик: ([пороги], [правила])}}, пороги по возрастанию
+    table = {}
+    for rule in sorted(rules, key=lambda r: r.threshold):
+        thresholds, compiled = table.setdefault(rule.on, {}).setdefault(rule.metric, ([], []))
+        thresholds.append(rule.threshold)
+        compiled.append(rule)
+    return table
+
+RULES = compile_rules(ACHIEVEMENT_RULES)
+
+
+def award_rules(store, username, events):
+    # events — [(тип события, вид спорта или None)] только что
+    # добавленных событий; None — проверить все виды. Выданное
+    # достижение само событие achievement_awarded: проверяется следом
+    # (уровни). Из потока ввода-вывода. -> названия выданных достижений
+    info = store.summary(username)
+    if not info:
+        return []
+    badges = info["stats"]["badges"]
+    titles = []
+    queue = list(events)
+    while queue:
+        kind, sport = queue.pop(0)
+        for metric, (thresholds, rules) in RULES.get(kind, {}).items():
+            if metric not in SPORT_METRICS:
+                sports = [None]
+            elif sport is None:
+                sports = list(info["stats"]["sports"])
+            else:
+                sports = [sport] if sport in info["stats"]["sports"] else []
+            for s in sports:
+                value = METRICS[metric](info, s)
+                # Пороги берутся по порядку, так что невыданные — хвост
+                # пройденных: идём от последнего пройденного назад
+                new = []
+                for rule in reversed(rules[:bisect_right(thresholds, value)]):
+                    key = rule.key if s is None else f"{rule.key}:{s}"
+                    if key in badges:
+                        break
+                    new.append((rule, key))
+                for rule, key in reversed(new):
+                    fmt = {"sport": s, "n": format_number(rule.threshold)}
+                    title = rule.title.format(**fmt)
+                    add_achievement(store, username, title, rule.description.format(**fmt),
+                                    rule.punkti, rule=key)
+                    badges[key] = True
+                    info["punkti"] += rule.punkti
+                    titles.append(title)
+                    queue.append(("achievement_awarded", None))
+    return titles
+
+
+# ═══════════════════════════════════════════════════════════
+#  GLABĀTUVE — подключаемые бэкенды хранения
+# ═══════════════════════════════════════════════════════════
+
+def file_version(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+class JsonFileBackend:
+    # Старый формат: один JSON на пользователя, переписывается целиком
+    def version(self, username):
+        return file_version(get_user_file(username))
+
+    def exists(self, username):
+        return self.version(username) is not None
+
+    def load(self, username):
+        data = load_user_data(username)
+        if data is not None:
+            data.pop("_seq", None)
+        return ensure_stats(data)
+
+    def write(self, username, data, events):
+        save_user_data(username, data)
+
+    def accounts(self):
+        return profile_accounts(self)
+
+
+class EventLogBackend:
+    # <name>.json — снимок, <name>.events.jsonl — события после него.
+    # Запись = дозапись строк в лог, снимок пересобирается раз в
+    # COMPACT_EVERY событий — или реже, пока лог короче самого профиля:
+    # иначе массовый импорт переписывал бы растущий снимок на каждой пачке.
+    COMPACT_EVERY = 500
+
+    def __init__(self):
+        self._seq = {}       # username -> номер последнего события
+        self._tail = {}      # username -> событий в логе после снимка
+
+    def get_log_file(self, username):
+        return os.path.join(DATA_DIR, f"{username}.events.jsonl")
+
+    def version(self, username):
+        snap = file_version(get_user_file(username))
+        log = file_version(self.get_log_file(username))
+        if snap is None and log is None:
+            return None
+        return (snap, log)
+
+    def exists(self, username):
+        return self.version(username) is not None
+
+    def load(self, username, repair=True):
+        # repair=False — только чтение: оборванный хвост лога пропускается,
+        # но не отрезается (migrate_sqlite не должен менять источник)
+        data = ensure_stats(load_user_data(username))
+        seq = data.pop("_seq", 0) if data is not None else 0
+        tail = 0
+        path = self.get_log_file(username)
+        if os.path.exists(path):
+            good = 0
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break   # строка без перевода — запись оборвалась
+                    try:
+                        event = load_json(line)
+                    except ValueError:
+                        break   # недописанная строка после сбоя
+                    good += len(line)
+                    if event["seq"] <= seq:
+                        continue   # уже вошло в снимок
+                    if data is None:
+                        data = {}
+                    apply_event(data, event)
+                    seq = event["seq"]
+                    tail += 1
+            if repair and good != os.path.getsize(path):
+                with open(path, "r+b") as f:
+                    f.truncate(good)
+        self._seq[username] = seq
+        self._tail[username] = tail
+        return data
+
+    def write(self, username, data, events):
+        self._append_log(username, events)
+        self._maybe_compact(username, data)
+
+    def _maybe_compact(self, username, data):
+        if self._tail[username] < max(self.COMPACT_EVERY, profile_size(data)):
+            return
+        try:
+            self.compact(username, data)
+        except Exception as e:
+            # события уже в логе — ошибка снимка не повод повторять пачку;
+            # снимок перепишется при следующей записи
+            Logger.warning("Storage: compacting %s failed: %s", username, e)
+
+    def _append_log(self, username, events):
+        if username not in self._seq:
+            self.load(username)
+        ensure_dir()
+        seq = self._seq[username]
+        lines = []
+        for event in events:
+            seq += 1
+            lines.append(dump_json(dict(event, seq=seq)) + b"\n")
+        with open(self.get_log_file(username), "ab") as f:
+            size = f.tell()
+            try:
+                f.write(b"".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+            except OSError:
+                # не оставлять половину пачки: UserStore повторит её целиком
+                f.truncate(size)
+                raise
+        self._seq[username] = seq
+        self._tail[username] += len(events)
+
+    def accounts(self):
+        # Для пересборки индексов: обход всех профилей только на чтение и
+        # без кэша — ни _seq этого бэкенда, ни (у SegmentBackend) перенос
+        # старых профилей в сегменты; UserStore зовёт его без своих замков
+        for username in list_usernames():
+            meta = EventLogBackend().load(username, repair=False)
+            if meta is not None:
+                yield {"username": username, "email": meta.get("email"),
+                       "password": meta.get("password"), "punkti": meta.get("punkti", 0)}
+
+    def compact(self, username, data):
+        # Снимок хранит _seq, поэтому сбой между заменой снимка и
+        # очисткой лога не приведёт к повторному применению событий
+        snapshot = dict(dump_profile(data), _seq=self._seq[username])
+        write_atomic(get_user_file(username), dump_json(snapshot, pretty=PRETTY_JSON))
+        open(self.get_log_file(username), "w").close()
+        self._tail[username] = 0
+
+
+def profile_size(data):
+    # Сколько записей во всех списках профиля
+    return sum(len(data.get(key, ())) for key in MODELS) if data else 0
+
+
+def profile_snapshot(data):
+    # Копия профиля на момент снятия событий с очереди: пока бэкенд пишет
+    # её без замка, add() дописывает в сам профиль. Записи неизменяемы —
+    # копируются только списки и stats
+    if data is None:
+        return None
+    snapshot = {k: list(v) if isinstance(v, list) else v for k, v in data.items()}
+    if "stats" in data:
+        snapshot["stats"] = copy.deepcopy(data["stats"])
+    return snapshot
+
+
+def profile_accounts(backend):
+    # Имя, почта, пароль и очки всех профилей — файлы приходится открывать
+    # по одному, поэтому вызывается только при пересборке индексов
+    for username in list_usernames():
+        data = backend.load(username)
+        if data is not None:
+            yield {"username": username, "email": data.get("email"),
+                   "password": data.get("password"), "punkti": data.get("punkti", 0)}
+
+
+def datums_sort_key(datums):
+    # "18.02.2026 15:31" -> "2026-02-18 15:31", чтобы строки сортировались по времени
+    parsed = parse_time(datums, DATETIME_FMT) or parse_time(datums, DATE_FMT)
+    return parsed.strftime("%Y-%m-%d %H:%M") if parsed else datums or ""
+
+
+SQL_COLUMNS = {
+    "izaicinajumi": ("title", "sport", "description", "target", "unit",
+                     "deadline", "datums"),
+    "rezultati":    ("sport", "value", "unit", "note", "datums"),
+    "sasniegumi":   ("title", "description", "punkti", "datums"),
+}
+USER_COLUMNS = ("email", "password", "punkti")
+
+SQL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    email    TEXT,
+    password TEXT,
+    punkti   INTEGER NOT NULL DEFAULT 0,
+    rev      INTEGER NOT NULL DEFAULT 0,
+    extra    TEXT
+);
+CREATE INDEX IF NOT EXISTS users_punkti ON users (punkti);
+
+CREATE TABLE IF NOT EXISTS izaicinajumi (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    title TEXT, sport TEXT, description TEXT, target TEXT, unit TEXT,
+    deadline TEXT, datums TEXT, ts TEXT, extra TEXT
+);
+CREATE INDEX IF NOT EXISTS izaicinajumi_user ON izaicinajumi (username, id);
+CREATE INDEX IF NOT EXISTS izaicinajumi_sport ON izaicinajumi (username, sport, ts);
+
+CREATE TABLE IF NOT EXISTS rezultati (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    sport TEXT, value TEXT, unit TEXT, note TEXT,
+    datums TEXT, ts TEXT, extra TEXT
+);
+CREATE INDEX IF NOT EXISTS rezultati_user ON rezultati (username, id);
+CREATE INDEX IF NOT EXISTS rezultati_sport ON rezultati (username, sport, ts);
+CREATE INDEX IF NOT EXISTS rezultati_ts ON rezultati (username, ts);
+
+CREATE TABLE IF NOT EXISTS sasniegumi (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    title TEXT, description TEXT, punkti INTEGER,
+    datums TEXT, ts TEXT, extra TEXT
+);
+CREATE INDEX IF NOT EXISTS sasniegumi_user ON sasniegumi (username, id);
+CREATE INDEX IF NOT EXISTS sasniegumi_ts ON sasniegumi (username, ts);
+"""
+
+
+class SqliteBackend:
+    # Все пользователи в одной базе, записи — строки таблиц с индексами
+    # по спорту и дате. Экраны могут брать только нужные строки (rows).
+    def __init__(self, path=None):
+        ensure_dir()
+        self.path = path or os.path.join(DATA_DIR, "users.db")
+        # Соединением пользуется поток ввода-вывода UserStore (под его замком)
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SQL_SCHEMA)
+
+    def version(self, username):
+        row = self.db.execute("SELECT rev FROM users WHERE username = ?",
+                              (username,)).fetchone()
+        return row["rev"] if row else None
+
+    def exists(self, username):
+        return self.version(username) is not None
+
+    def _record(self, key, row):
+        record = {col: row[col] for col in SQL_COLUMNS[key]}
+        if row["extra"]:
+            record.update(load_json(row["extra"]))
+        return MODELS[key].from_dict(record)
+
+    def load(self, username):
+        row = self.db.execute("SELECT * FROM users WHERE username = ?",
+                              (username,)).fetchone()
+        if row is None:
+            return None
+        data = {"username": username}
+        data.update({col: row[col] for col in USER_COLUMNS})
+        if row["extra"]:
+            data.update(load_json(row["extra"]))
+        for key in SQL_COLUMNS:
+            data[key] = [self._record(key, r) for r in self.db.execute(
+                f"SELECT * FROM {key} WHERE username = ? ORDER BY id", (username,))]
+        return ensure_stats(data)
+
+    def rows(self, username, key, offset=0, limit=None):
+        # Новые сверху, как на экранах
+        cur = self.db.execute(
+            f"SELECT * FROM {key} WHERE username = ? ORDER BY id DESC "
+            f"LIMIT ? OFFSET ?",
+            (username, -1 if limit is None else limit, offset))
+        return [self._record(key, r) for r in cur]
+
+    def count(self, username, key):
+        return self.db.execute(f"SELECT COUNT(*) FROM {key} WHERE username = ?",
+                               (username,)).fetchone()[0]
+
+    def summary(self, username):
+        row = self.db.execute("SELECT * FROM users WHERE username = ?",
+                              (username,)).fetchone()
+        if row is None:
+            return None
+        stats = self._stats(username, row)
+        info = {"username": username, "email": row["email"], "punkti": row["punkti"],
+                "stats": stats}
+        for key in SQL_COLUMNS:
+            info[key] = stats[key]
+        return info
+
+    def _stats(self, username, row=None):
+        if row is None:
+            row = self.db.execute("SELECT extra FROM users WHERE username = ?",
+                                  (username,)).fetchone()
+        extra = load_json(row["extra"]) if row["extra"] else {}
+        if stats_current(extra.get("stats")):
+            return upgrade_stats(extra["stats"])
+        return self.load(username)["stats"]
+
+    def _insert(self, username, key, record):
+        if isinstance(record, Record):
+            record = record.to_dict()
+        cols = SQL_COLUMNS[key]
+        extra = {k: v for k, v in record.items() if k not in cols}
+        self.db.execute(
+            f"INSERT INTO {key} (username, {', '.join(cols)}, ts, extra) "
+            f"VALUES (?, {', '.join('?' * len(cols))}, ?, ?)",
+            (username, *[record.get(c) for c in cols],
+             datums_sort_key(record.get("datums")),
+             dump_json(extra).decode("utf-8") if extra else None))
+
+    def _update_user(self, username, fields):
+        cols = {k: v for k, v in fields.items() if k in USER_COLUMNS}
+        extra = {k: v for k, v in fields.items()
+                 if k not in USER_COLUMNS and k != "username" and k not in SQL_COLUMNS}
+        if cols:
+            self.db.execute(
+                f"UPDATE users SET {', '.join(f'{c} = ?' for c in cols)} "
+                f"WHERE username = ?", (*cols.values(), username))
+        if extra:
+            row = self.db.execute("SELECT extra FROM users WHERE username = ?",
+                                  (username,)).fetchone()
+            merged = load_json(row["extra"]) if row["extra"] else {}
+            merged.update(extra)
+            self.db.execute("UPDATE users SET extra = ? WHERE username = ?",
+                            (dump_json(merged).decode("utf-8"), username))
+
+    def write(self, username, data, events):
+        with self.db:
+            stats = None
+            for event in events:
+                kind, record = event["type"], event["data"]
+                if kind == "user_created":
+                    self.db.execute("INSERT INTO users (username) VALUES (?)",
+                                    (username,))
+                    self._update_user(username, record)
+                    for key in SQL_COLUMNS:
+                        for item in record.get(key, []):
+                            self._insert(username, key, item)
+                    stats = build_stats(record)
+                elif kind == "user_updated":
+                    self._update_user(username, record)
+                elif kind == "records_archived":
+                    if stats is None:
+                        stats = self._stats(username)
+                    key = record["key"]
+                    self.db.execute(
+                        f"DELETE FROM {key} WHERE id IN (SELECT id FROM {key} "
+                        f"WHERE username = ? ORDER BY id LIMIT ?)",
+                        (username, record["count"]))
+                    update_stats(stats, kind, record)
+                else:
+                    if stats is None:
+                        stats = self._stats(username)
+                    self._insert(username, EVENT_LISTS[kind], record)
+                    update_stats(stats, kind, as_model(EVENT_LISTS[kind], record))
+                    if kind == "achievement_awarded":
+                        self.db.execute(
+                            "UPDATE users SET punkti = punkti + ? WHERE username = ?",
+                            (record["punkti"], username))
+            if stats is not None:
+                self._update_user(username, {"stats": stats})
+            self.db.execute("UPDATE users SET rev = rev + 1 WHERE username = ?",
+                            (username,))
+
+    def accounts(self):
+        return [dict(row) for row in self.db.execute(
+            "SELECT username, email, password, punkti FROM users")]
+
+    def import_user(self, data):
+        # Для миграции: весь профиль одним событием
+        username = data["username"]
+        if self.exists(username):
+            return False
+        self.write(username, data, [{"type": "user_created", "data": data}])
+        return True
+
+
+# Результаты отдельно от профиля, в двух файлах с дозаписью:
+#   <name>.results.dat — заголовок (логическое смещение первого байта)
+#                        и записи JSON подряд;
+#   <name>.results.idx — заголовок (номер первой записи после архива) и
+#                        по ENTRY фиксированной ширины на результат:
+#                        смещение, длина, день (ordinal) и номер вида спорта.
+# Оба читаются через mmap: "последние N", "по виду спорта" и "между
+# датами" — проход по индексу и чтение байтов только нужных записей.
+# Данные дописываются раньше индекса, поэтому запись, оборванная сбоем,
+# в индекс не попадёт, а её байты отрезаются при открытии. Виды спорта —
+# строки <name>.results.sports, номер вида — номер строки.
+
+class ResultSegment:
+    HEADER = struct.Struct("<Q")
+    ENTRY = struct.Struct("<QIiI")
+    SCAN = 4096          # записей индекса за один срез при поиске
+
+    def __init__(self, username, repair=True):
+        # repair=False — открыть только для чтения, следы сбоя не отрезать
+        path = os.path.join(DATA_DIR, f"{username}.results")
+        self.dat_path, self.idx_path = path + ".dat", path + ".idx"
+        self.sports_path = path + ".sports"
+        self._maps = {}      # путь -> (mmap, размер файла при отображении)
+        self.sports = self._read_sports(repair)
+        self._codes = {sport: i for i, sport in enumerate(self.sports)}
+        self.base = self.count = 0
+        self._origin = self._end = 0
+        if os.path.exists(self.idx_path):
+            self._recover(repair)
+
+    def _read_sports(self, repair=True):
+        if not os.path.exists(self.sports_path):
+            return []
+        sports, good = [], 0
+        with open(self.sports_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                sports.append(load_json(line))
+                good += len(line)
+        if repair and good != os.path.getsize(self.sports_path):
+            with open(self.sports_path, "r+b") as f:
+                f.truncate(good)
+        return sports
+
+    def _recover(self, repair=True):
+        # Хвост индекса без целой записи и байты данных за последней
+        # записью индекса — следы оборванной дозаписи
+        mode = "r+b" if repair else "rb"
+        with open(self.idx_path, mode) as f:
+            self.base, = self.HEADER.unpack(f.read(self.HEADER.size))
+            size = os.fstat(f.fileno()).st_size - self.HEADER.size
+            self.count = size // self.ENTRY.size
+            if repair:
+                f.truncate(self.HEADER.size + self.count * self.ENTRY.size)
+        with open(self.dat_path, mode) as f:
+            self._origin, = self.HEADER.unpack(f.read(self.HEADER.size))
+            self._end = self._origin
+            if self.count:
+                offset, length, _, _ = self.entry(self.count - 1)
+                self._end = offset + length
+            if repair:
+                f.truncate(self.HEADER.size + self._end - self._origin)
+
+    def _map(self, path):
+        # Отображение пересоздаётся, только если файл вырос
+        size = os.path.getsize(path)
+        mm, mapped = self._maps.get(path, (None, 0))
+        if size != mapped:
+            if mm is not None:
+                mm.close()
+            with open(path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[path] = (mm, size)
+        return mm
+
+    def close(self):
+        for mm, _ in self._maps.values():
+            mm.close()
+        self._maps.clear()
+
+    def entry(self, i):
+        # -> (смещение, длина, день, номер вида спорта) i-й живой записи
+        return self.ENTRY.unpack_from(self._map(self.idx_path),
+                                      self.HEADER.size + i * self.ENTRY.size)
+
+    def _entries(self, start, stop):
+        # Записи индекса [start, stop) по порядку — одним срезом
+        first = self.HEADER.size + start * self.ENTRY.size
+        raw = self._map(self.idx_path)[first:first + (stop - start) * self.ENTRY.size]
+        return list(self.ENTRY.iter_unpack(raw))
+
+    def _read(self, dat, entry):
+        start = self.HEADER.size + entry[0] - self._origin
+        return as_model("rezultati", load_json(dat[start:start + entry[1]]))
+
+    def records(self, start=0, stop=None):
+        # Записи с позициями [start, stop), старые первыми
+        stop = self.count if stop is None else stop
+        if start >= stop:
+            return []
+        dat = self._map(self.dat_path)
+        return [self._read(dat, entry) for entry in self._entries(start, stop)]
+
+    def _code(self, sport, new):
+        if sport not in self._codes:
+            self._codes[sport] = len(self.sports)
+            self.sports.append(sport)
+            new.append(dump_json(sport) + b"\n")
+        return self._codes[sport]
+
+    def append(self, records):
+        if not records:
+            return
+        ensure_dir()
+        if not os.path.exists(self.idx_path):
+            write_atomic(self.dat_path, self.HEADER.pack(self._end))
+            write_atomic(self.idx_path, self.HEADER.pack(self.base))
+        chunks, entries, sports = [], [], []
+        offset = self._end
+        for record in records:
+            if isinstance(record, Record):
+                record = record.to_dict()
+            raw = dump_json(record) + b"\n"
+            day = parse_time(record.get("datums"), DATETIME_FMT)
+            entries.append(self.ENTRY.pack(offset, len(raw), day.toordinal() if day else 0,
+                                           self._code(record.get("sport", ""), sports)))
+            chunks.append(raw)
+            offset += len(raw)
+        try:
+            for path, raw in ((self.sports_path, sports), (self.dat_path, chunks),
+                              (self.idx_path, entries)):
+                if raw:
+                    with open(path, "ab") as f:
+                        f.write(b"".join(raw))
+                        f.flush()
+                        os.fsync(f.fileno())
+        except Exception:
+            self.truncate(self.count)
+            raise
+        self._end = offset
+        self.count += len(records)
+
+    def truncate(self, count):
+        # Отменить дозапись: индекс обрезается до count записей, байты
+        # данных за ними отрезает _recover
+        self.close()
+        with open(self.idx_path, "r+b") as f:
+            f.truncate(self.HEADER.size + count * self.ENTRY.size)
+        self._recover()
+
+    def rows(self, offset=0, limit=None):
+        # Новые сверху, как UserStore.rows
+        stop = self.count - offset
+        start = 0 if limit is None else max(0, stop - limit)
+        return self.records(start, stop)[::-1]
+
+    def find(self, sport=None, since=None, until=None, limit=None):
+        # Новые сверху; since/until — date, включительно. Данные читаются
+        # только для записей, прошедших фильтр по индексу
+        code = self._codes.get(sport)
+        if (sport is not None and code is None) or not self.count:
+            return []
+        low = since.toordinal() if since else None
+        high = until.toordinal() if until else None
+        dat = self._map(self.dat_path)
+        found = []
+        stop = self.count
+        while stop > 0:
+            start = max(0, stop - self.SCAN)
+            for entry in reversed(self._entries(start, stop)):
+                if code is not None and entry[3] != code:
+                    continue
+                if low is not None and (not entry[2] or entry[2] < low):
+                    continue
+                if high is not None and (not entry[2] or entry[2] > high):
+                    continue
+                found.append(self._read(dat, entry))
+                if limit is not None and len(found) >= limit:
+                    return found
+            stop = start
+        return found
+
+    def expired(self, day):
+        # Сколько первых записей датированы раньше day (ordinal): индекс
+        # читается срезами до первой более новой записи или записи без даты
+        start = 0
+        while start < self.count:
+            stop = min(self.count, start + self.SCAN)
+            for n, entry in enumerate(self._entries(start, stop), start):
+                if not entry[2] or entry[2] >= day:
+                    return n
+            start = stop
+        return self.count
+
+    def drop(self, n):
+        # Первые n записей ушли в архив. Сначала индекс, потом данные, и
+        # каждый файл подменяется целиком: в любой момент данные содержат
+        # все записи, на которые ссылается индекс
+        keep = min(n, self.count)
+        entries = self._map(self.idx_path)[self.HEADER.size + keep * self.ENTRY.size:]
+        origin = self.entry(keep)[0] if keep < self.count else self._end
+        start = self.HEADER.size + origin - self._origin
+        data = self._map(self.dat_path)[start:]
+        self.close()   # на Windows отображённый файл не подменить
+        write_atomic(self.idx_path, self.HEADER.pack(self.base + n) + entries)
+        write_atomic(self.dat_path, self.HEADER.pack(origin) + data)
+        self.base += n
+        self.count -= keep
+        self._origin = origin
+
+
+class PartialWrite(Exception):
+    # Первые written событий пачки уже на диске — повторять только остальные
+    def __init__(self, written, error):
+        super().__init__(str(error))
+        self.written = written
+
+
+class SegmentBackend(EventLogBackend):
+    # Профиль без результатов — снимок и лог событий, как у EventLogBackend,
+    # результаты — в ResultSegment. Профиль небольшой и держится в памяти,
+    # а экраны берут результаты через rows/count/summary, как у SQLite.
+    # Результаты в лог не пишутся: снимок хранит "_results" — сколько их
+    # уже учтено в stats, остальные досчитываются из сегмента при загрузке.
+    # Профили EventLogBackend переносятся в этот формат при первом чтении.
+
+    def __init__(self):
+        super().__init__()
+        self._meta = {}       # username -> профиль без результатов
+        self._segments = {}   # username -> ResultSegment
+
+    def segment(self, username):
+        if username not in self._segments:
+            self._segments[username] = ResultSegment(username)
+        return self._segments[username]
+
+    def _results(self, username):
+        # Сегмент — только после загрузки профиля: она переносит результаты
+        # старого формата и доделывает прерванную архивацию
+        self._profile(username)
+        return self.segment(username)
+
+    def version(self, username):
+        profile = super().version(username)
+        if profile is None:
+            return None
+        return (profile, file_version(self.segment(username).idx_path))
+
+    def _profile(self, username):
+        if username in self._meta:
+            return self._meta[username]
+        meta = EventLogBackend.load(self, username)
+        if meta is None:
+            return None
+        self._meta[username] = meta
+        segment = self.segment(username)
+        archived = meta["stats"]["archived"].get("rezultati", 0)
+        if segment.base < archived:
+            # сбой между событием records_archived и сегментом; уходящие
+            # записи, ещё не учтённые в stats, учитываются до drop
+            seen = max(0, meta.get("_results", 0) - segment.base)
+            for r in segment.records(seen, archived - segment.base):
+                update_stats(meta["stats"], "result_added", r)
+            meta["_results"] = max(meta.get("_results", 0), archived)
+            segment.drop(archived - segment.base)
+        if meta["rezultati"]:
+            if not segment.count:
+                segment.base = archived
+                segment.append(meta["rezultati"])
+            meta["rezultati"] = []
+            meta["_results"] = segment.base + segment.count
+            self.compact(username)
+        seen = max(0, meta.get("_results", 0) - segment.base)
+        for r in segment.records(seen):
+            update_stats(meta["stats"], "result_added", r)
+        meta["_results"] = segment.base + segment.count
+        return meta
+
+    def load(self, username):
+        # Полный профиль — для UserStore.get; списки копируются, т.к.
+        # store дописывает в них сам
+        meta = self._profile(username)
+        if meta is None:
+            return None
+        data = {k: v for k, v in meta.items() if k != "_results"}
+        for key in MODELS:
+            data[key] = list(meta.get(key, []))
+        data["rezultati"] = self.segment(username).rows()[::-1]
+        data["stats"] = copy.deepcopy(meta["stats"])
+        return data
+
+    def read(self, username):
+        # Полный профиль без записи на диск — для migrate_sqlite. То же,
+        # что _profile + load, но старый формат не переносится, а
+        # прерванная архивация и следы сбоя учитываются только в памяти
+        data = EventLogBackend().load(username, repair=False)
+        if data is None:
+            return None
+        segment = ResultSegment(username, repair=False)
+        try:
+            archived = data["stats"]["archived"].get("rezultati", 0)
+            skip = min(max(0, archived - segment.base), segment.count)
+            seen = data.pop("_results", 0)
+            if not data["rezultati"]:
+                for r in segment.records(max(0, seen - segment.base)):
+                    update_stats(data["stats"], "result_added", r)
+                data["rezultati"] = segment.records(skip)
+            elif segment.count:
+                # сбой между переносом в сегмент и снимком: stats уже
+                # учли эти результаты
+                data["rezultati"] = segment.records(skip)
+        finally:
+            segment.close()
+        return data
+
+    def write(self, username, data, events):
+        try:
+            self._write(username, events)
+        except Exception:
+            # профиль в памяти мог уйти вперёд диска — перечитать при повторе
+            self._meta.pop(username, None)
+            self._seq.pop(username, None)
+            segment = self._segments.pop(username, None)
+            if segment is not None:
+                segment.close()
+            raise
+
+    def _write(self, username, events):
+        meta = self._profile(username)
+        if meta is None:
+            meta = self._meta[username] = {"_results": 0}
+            self._seq[username], self._tail[username] = 0, 0
+        segment = self.segment(username)
+        logged, results = [], []
+        written = 0   # событий пачки, которые уже на диске
+        try:
+            for n, event in enumerate(events, 1):
+                kind, record = event["type"], event["data"]
+                if kind == "result_added":
+                    moved = [record]
+                else:
+                    moved = record.get("rezultati", []) if kind == "user_created" else []
+                    if moved:
+                        event = dict(event, data={k: v for k, v in record.items()
+                                                  if k != "rezultati"})
+                    apply_event(meta, event)
+                    logged.append(event)
+                    if kind == "records_archived" and record["key"] == "rezultati":
+                        # событие в логе раньше, чем drop: после сбоя
+                        # _profile доделает drop по stats["archived"]
+                        self._commit(username, segment, logged, results)
+                        written = n
+                        segment.drop(record["count"])
+                        logged, results = [], []
+                for r in moved:
+                    update_stats(meta["stats"], "result_added", as_model("rezultati", r))
+                results.extend(moved)
+                meta["_results"] += len(moved)
+            self._commit(username, segment, logged, results)
+        except Exception as e:
+            raise PartialWrite(written, e) from e
+        self._tail[username] += len(results)
+        self._maybe_compact(username, meta)
+
+    def _commit(self, username, segment, logged, results):
+        # Часть пачки целиком или ничего: результаты, потом лог; если лог
+        # не записался, результаты отрезаются, и UserStore повторит всё
+        count = segment.count
+        segment.append(results)
+        if logged:
+            try:
+                self._append_log(username, logged)
+            except Exception:
+                if results:
+                    segment.truncate(count)
+                raise
+
+    def compact(self, username, data=None):
+        # data (полный профиль от UserStore.compact) не нужен — в снимок
+        # идёт профиль без результатов
+        EventLogBackend.compact(self, username, self._profile(username))
+
+    def rows(self, username, key, offset=0, limit=None):
+        if key == "rezultati":
+            return self._results(username).rows(offset, limit)
+        meta = self._profile(username)
+        items = meta.get(key, []) if meta else []
+        end = len(items) - offset
+        if end <= 0:
+            return []
+        start = 0 if limit is None else max(0, end - limit)
+        return items[start:end][::-1]
+
+    def count(self, username, key):
+        if key == "rezultati":
+            return self._results(username).count
+        meta = self._profile(username)
+        return len(meta.get(key, [])) if meta else 0
+
+    def find(self, username, sport=None, since=None, until=None, limit=None):
+        return self._results(username).find(sport, since, until, limit)
+
+    def expired(self, username, key, before):
+        # Только для результатов: день записи есть в индексе сегмента
+        if key != "rezultati":
+            return None
+        return self._results(username).expired(before.toordinal())
+
+    def summary(self, username):
+        meta = self._profile(username)
+        if meta is None:
+            return None
+        info = {key: meta.get(key) for key in ("username", "email", "punkti")}
+        info["stats"] = copy.deepcopy(meta["stats"])
+        for key in EVENT_LISTS.values():
+            info[key] = info["stats"][key]
+        return info
+
+
+
+# Бэкенд хранения выбирается SPORTA_STORAGE=json|eventlog|segment|sqlite
+# (по умолчанию segment); перед переходом на sqlite — migrate_sqlite.py
+STORAGE_BACKEND = os.environ.get("SPORTA_STORAGE") or "segment"
+BACKENDS = {
+    "json":     JsonFileBackend,
+    "eventlog": EventLogBackend,
+    "segment":  SegmentBackend,
+    "sqlite":   SqliteBackend,
+}
+if STORAGE_BACKEND not in BACKENDS:
+    raise ValueError(f"SPORTA_STORAGE={STORAGE_BACKEND!r}: "
+                     f"jābūt vienam no {', '.join(BACKENDS)}")
+
+
+# ═══════════════════════════════════════════════════════════
+#  ARHĪVS — старые записи в сжатых сегментах
+# ═══════════════════════════════════════════════════════════
+# Записи старше RETENTION_DAYS уходят из живого профиля в сегменты
+# <name>.<список>.<номер первой записи>.jsonl.gz (или .zst, если
+# установлен zstandard) по ARCHIVE_SEGMENT записей. В профиле остаётся
+# только счётчик stats["archived"]; номера записей не меняются —
+# store.count/rows/tail считают архив частью списка, поэтому счётчики,
+# синхронизация и "старые записи" при прокрутке работают как раньше.
+# Сегмент пишется до события records_archived: сбой между ними оставит
+# лишь сегмент, который следующий проход перезапишет тем же именем.
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+RETENTION_DAYS = int(os.environ.get("SPORTA_RETENTION_DAYS", 180))
+RETENTION_LISTS = ("sasniegumi", "rezultati")
+ARCHIVE_SEGMENT = 5000
+ARCHIVE_MIN = 500       # меньше старых записей — не архивируем
+ARCHIVE_SUFFIXES = (".jsonl.zst", ".jsonl.gz")
+
+
+def archive_segments(username, key):
+    # -> [(номер первой записи, путь)] по возрастанию
+    prefix = f"{username}.{key}."
+    if not os.path.isdir(DATA_DIR):
+        return []
+    segments = []
+    for fn in os.listdir(DATA_DIR):
+        if fn.startswith(prefix) and fn.endswith(ARCHIVE_SUFFIXES):
+            first = fn[len(prefix):].split(".", 1)[0]
+            if first.isdigit():
+                segments.append((int(first), os.path.join(DATA_DIR, fn)))
+    return sorted(segments)
+
+def write_segment(username, key, first, records):
+    raw = b"".join(dump_json(r.to_dict()) + b"\n" for r in records)
+    if zstandard is not None:
+        path = os.path.join(DATA_DIR, f"{username}.{key}.{first:09d}.jsonl.zst")
+        raw = zstandard.ZstdCompressor().compress(raw)
+    else:
+        path = os.path.join(DATA_DIR, f"{username}.{key}.{first:09d}.jsonl.gz")
+        raw = gzip.compress(raw, compresslevel=6)
+    write_atomic(path, raw)
+
+@contextmanager
+def open_segment(path):
+    with open(path, "rb") as raw:
+        if path.endswith(".zst"):
+            stream = zstandard.ZstdDecompressor().stream_reader(raw)
+            yield io.BufferedReader(stream)
+        else:
+            yield gzip.GzipFile(fileobj=raw)
+
+def iter_archive(username, key, start=0, stop=None):
+    # Записи архива с номерами [start, stop) по порядку, построчно;
+    # сегменты целиком до start не распаковываются
+    segments = archive_segments(username, key)
+    for n, (first, path) in enumerate(segments):
+        if stop is not None and first >= stop:
+            return
+        if n + 1 < len(segments) and segments[n + 1][0] <= start:
+            continue
+        with open_segment(path) as f:
+            for i, line in enumerate(f, first):
+                if stop is not None and i >= stop:
+                    return
+                if i >= start:
+                    yield as_model(key, load_json(line))
+
+
+def archive_old(store, username, days=RETENTION_DAYS):
+    # Из потока ввода-вывода. Архивируется только начало списка: записи
+    # идут по времени, а живой список должен остаться его хвостом.
+    # Граница — целый день: сегментный бэкенд знает по индексу только дату.
+    # -> {список: сколько записей ушло в архив}
+    cutoff = (datetime.now() - timedelta(days=days)).date()
+    moved = {}
+    for key in RETENTION_LISTS:
+        archived = store.archived(username, key)
+        records = store.expired(username, key, cutoff)
+        old = len(records)
+        if old < ARCHIVE_MIN:
+            continue
+        for i in range(0, old, ARCHIVE_SEGMENT):
+            write_segment(username, key, archived + i, records[i:min(old, i + ARCHIVE_SEGMENT)])
+        store.add(username, "records_archived", {"key": key, "count": old})
+        moved[key] = old
+    if moved:
+        store.compact(username)   # снимок профиля без ушедших записей
+    return moved
+
+
+# ═══════════════════════════════════════════════════════════
+#  PAROLES — хэши паролей и индекс для входа
+# ═══════════════════════════════════════════════════════════
+# Пароль хранится как "scrypt$N$r$p$соль$хэш" (или pbkdf2_sha256, если
+# в сборке Python нет scrypt). Стоимость подбирается под устройство один
+# раз — чтобы хэш считался около KDF_TARGET секунд — и сохраняется в
+# user_data/kdf.idx. Старые пароли открытым текстом и хэши со слабыми
+# параметрами переписываются при входе.
+
+KDF_TARGET = 0.15                    # секунд на один хэш
+SCRYPT_N = (2 ** 12, 2 ** 15)        # границы N; 2**15 при r=8 — 32 МиБ памяти
+PBKDF2_ITERATIONS = (50_000, 1_000_000)
+SESSION_KEY = os.urandom(32)
+
+
+def kdf_params():
+    path = os.path.join(DATA_DIR, "kdf.idx")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return load_json(f.read())
+    params = calibrate_kdf()
+    ensure_dir()
+    write_atomic(path, dump_json(params))
+    return params
+
+
+def calibrate_kdf():
+    # Один пробный хэш на нижней границе, дальше — пропорция
+    if hasattr(hashlib, "scrypt"):
+        n = SCRYPT_N[0]
+        t = time.perf_counter()
+        _kdf({"algo": "scrypt", "n": n, "r": 8, "p": 1}, b"calibrate", b"0" * 16)
+        dt = max(time.perf_counter() - t, 1e-6)
+        while n * 2 <= SCRYPT_N[1] and dt * 2 <= KDF_TARGET:
+            n, dt = n * 2, dt * 2
+        return {"algo": "scrypt", "n": n, "r": 8, "p": 1}
+    iterations = PBKDF2_ITERATIONS[0]
+    t = time.perf_counter()
+    _kdf({"algo": "pbkdf2_sha256", "iterations": iterations}, b"calibrate", b"0" * 16)
+    dt = max(time.perf_counter() - t, 1e-6)
+    iterations = int(iterations * KDF_TARGET / dt)
+    return {"algo": "pbkdf2_sha256",
+            "iterations": min(max(iterations, PBKDF2_ITERATIONS[0]), PBKDF2_ITERATIONS[1])}
+
+
+def _kdf(params, password, salt):
+    if params["algo"] == "scrypt":
+        n, r, p = params["n"], params["r"], params["p"]
+        return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * r * (n + p + 2))
+    return hashlib.pbkdf2_hmac("sha256", password, salt, params["iterations"])
+
+
+def _format_hash(params, salt, digest):
+    if params["algo"] == "scrypt":
+        head = f"scrypt${params['n']}${params['r']}${params['p']}"
+    else:
+        head = f"pbkdf2_sha256${params['iterations']}"
+    return f"{head}${salt.hex()}${digest.hex()}"
+
+
+def _parse_hash(stored):
+    # -> (params, соль, хэш) или None, если это не наш формат (открытый текст)
+    parts = stored.split("$")
+    try:
+        if parts[0] == "scrypt" and len(parts) == 6:
+            params = {"algo": "scrypt", "n": int(parts[1]), "r": int(parts[2]),
+                      "p": int(parts[3])}
+        elif parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            params = {"algo": "pbkdf2_sha256", "iterations": int(parts[1])}
+        else:
+            return None
+        return params, bytes.fromhex(parts[-2]), bytes.fromhex(parts[-1])
+    except ValueError:
+        return None
+
+
+def hash_password(password):
+    params = kdf_params()
+    salt = os.urandom(16)
+    return _format_hash(params, salt, _kdf(params, password.encode("utf-8"), salt))
+
+
+def verify_password(stored, password):
+    # -> (верно ли, нужно ли пересчитать хэш с текущими параметрами)
+    parsed = _parse_hash(stored or "")
+    if parsed is None:
+        # профиль из старой версии — пароль открытым текстом
+        ok = hmac.compare_digest((stored or "").encode("utf-8"), password.encode("utf-8"))
+        return ok, ok
+    params, salt, digest = parsed
+    ok = hmac.compare_digest(_kdf(params, password.encode("utf-8"), salt), digest)
+    return ok, ok and params != kdf_params()
+
+
+class UserDirectory:
+    # Каталог пользователей user_data/users.idx: имя без учёта регистра ->
+    # имя как при регистрации, почта, хэш пароля и бэкенд хранения.
+    # "Занято ли имя" и вход — один поиск в словаре, профиль не читается.
+    # Успешные проверки пароля запоминаются до конца сессии (HMAC с
+    # ключом сессии), чтобы повторный вход не считал KDF.
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DATA_DIR, "users.idx")
+        self._users = {}       # username.casefold() -> запись
+        self._verified = {}    # username -> (хэш, HMAC пароля)
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, backend, backend_name):
+        # С диска, а если файла ещё нет — один проход по всем профилям
+        directory = cls()
+        if os.path.exists(directory.path):
+            with open(directory.path, "rb") as f:
+                directory._users = load_json(f.read())
+        else:
+            for account in backend.accounts():
+                directory.add(account["username"], account.get("email"),
+                              account.get("password"), backend_name)
+        return directory
+
+    def __len__(self):
+        return len(self._users)
+
+    def find(self, username):
+        return self._users.get(username.casefold())
+
+    def add(self, username, email, password_hash, backend_name):
+        with self._lock:
+            self._users[username.casefold()] = {
+                "username": username, "email": email,
+                "password": password_hash, "backend": backend_name,
+            }
+            self._dirty = True
+
+    def set_password(self, username, stored):
+        with self._lock:
+            entry = self._users[username.casefold()]
+            if entry["password"] != stored:
+                entry["password"] = stored
+                self._dirty = True
+
+    def _session_mac(self, password):
+        return hmac.new(SESSION_KEY, password.encode("utf-8"), hashlib.sha256).digest()
+
+    def check(self, username, stored, password):
+        # -> (верно ли, нужно ли пересчитать хэш)
+        cached = self._verified.get(username)
+        if cached and cached[0] == stored and hmac.compare_digest(
+                cached[1], self._session_mac(password)):
+            return True, False
+        ok, rehash = verify_password(stored, password)
+        if ok:
+            self._verified[username] = (stored, self._session_mac(password))
+        return ok, rehash
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            raw = dump_json(self._users)
+            self._dirty = False
+        ensure_dir()
+        write_atomic(self.path, raw)
+
+
+# ═══════════════════════════════════════════════════════════
+#  LĪDERU TABULA — индекс очков всех пользователей
+# ═══════════════════════════════════════════════════════════
+# Чтобы построить рейтинг, не нужно открывать профиль каждого ученика:
+# отсортированный список (-punkti, username) лежит в отдельном файле и
+# обновляется при каждом начислении очков. Место — бинарный поиск,
+# топ — срез списка.
+
+class Leaderboard:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DATA_DIR, "leaderboard.idx")
+        self._keys = []      # [(-punkti, username)] по возрастанию
+        self._points = {}    # username -> punkti
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, backend):
+        # Индекс с диска, а если его ещё нет — собираем по бэкенду один раз
+        board = cls()
+        if os.path.exists(board.path):
+            with open(board.path, "rb") as f:
+                board._points = dict(load_json(f.read())["users"])
+        else:
+            board._points = {a["username"]: a.get("punkti", 0) for a in backend.accounts()}
+            board._dirty = True
+        board._keys = sorted((-p, name) for name, p in board._points.items())
+        return board
+
+    def __len__(self):
+        return len(self._points)
+
+    def _set(self, username, punkti):
+        old = self._points.get(username)
+        if old == punkti:
+            return
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old, username))]
+        insort(self._keys, (-punkti, username))
+        self._points[username] = punkti
+        self._dirty = True
+
+    def set(self, username, punkti):
+        with self._lock:
+            self._set(username, punkti)
+
+    def points(self, username):
+        return self._points.get(username)
+
+    def rank(self, username):
+        # Одинаковые очки — одинаковое место ("" меньше любого имени)
+        with self._lock:
+            punkti = self._points.get(username)
+            if punkti is None:
+                return None
+            return bisect_left(self._keys, (-punkti, "")) + 1
+
+    def top(self, k):
+        # [(место, username, punkti)] для первых k
+        with self._lock:
+            out = []
+            for i, (neg, name) in enumerate(self._keys[:k]):
+                place = out[-1][0] if out and out[-1][2] == -neg else i + 1
+                out.append((place, name, -neg))
+            return out
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            rows = [[name, -neg] for neg, name in self._keys]
+            self._dirty = False
+        ensure_dir()
+        write_atomic(self.path, dump_json({"users": rows}))
+
+
+# ═══════════════════════════════════════════════════════════
+#  LIETOTĀJU KEŠS — данные пользователя в памяти сессии
+# ═══════════════════════════════════════════════════════════
+
+IO_THREAD = "sporta-io"
+WRITE_RETRY = 10     # секунд до повтора неудавшейся записи
+TAIL_PAGE = 1000     # записей за один захват замка в store.tail
+
+
+class UserStore:
+    # Держит профиль в памяти: бэкенд перечитывается только при
+    # изменении версии файлов, а события копятся и пишутся пачкой.
+    # Если бэкенд умеет отдавать строки сам (rows/summary), профиль
+    # целиком в память не поднимается.
+    #
+    # Весь дисковый ввод-вывод идёт в одном фоновом потоке: записи
+    # выполняются по очереди, а экраны читают через run_async и получают
+    # результат обратно в главном потоке через Clock.
+    def __init__(self, backend=None, delay=1.5):
+        self.backend = backend or BACKENDS[STORAGE_BACKEND]()
+        self.backend_name = next((name for name, cls in BACKENDS.items()
+                                  if type(self.backend) is cls), None)
+        self._data = {}      # username -> dict
+        self._version = {}   # username -> версия бэкенда при чтении/записи
+        self._pending = {}   # username -> ещё не записанные события
+        self._writing = {}   # username -> события, которые пишутся сейчас
+        self._generation = {}  # username -> счётчик перечитываний извне
+        # _lock — словари выше, держится коротко; _backend_lock — сам
+        # бэкенд, его держит запись на время fsync и сжатия снимка.
+        # Порядок всегда _lock, потом _backend_lock, и никогда наоборот
+        self._lock = threading.RLock()
+        self._backend_lock = threading.RLock()
+        self._index_lock = threading.Lock()   # индексы открываются один раз
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix=IO_THREAD)
+        self._scheduled = set()   # пользователи, чья запись уже в очереди
+        self._leaderboard = None
+        self._directory = None
+        self._flush_trigger = Clock.create_trigger(self.flush, delay)
+
+    @property
+    def queryable(self):
+        return hasattr(self.backend, "rows")
+
+    def run_async(self, fn, callback=None, on_error=None):
+        # fn выполняется в потоке ввода-вывода, callback(результат) — в главном.
+        # Ошибка fn пишется в лог и не доходит до цикла Kivy: вместо
+        # callback в главном потоке вызывается on_error(исключение),
+        # по умолчанию — окно с сообщением
+        if TRACE.enabled:
+            fn = TRACE.traced(fn)
+            if callback is not None:
+                callback = TRACE.traced(callback)
+
+        def done(future):
+            try:
+                result = future.result()
+            except Exception as e:
+                Logger.error("Storage: background job %s failed",
+                             getattr(fn, "__qualname__", fn), exc_info=e)
+                if callback is not None:
+                    Clock.schedule_once(lambda dt, e=e: (on_error or show_io_error)(e), 0)
+                return
+            if callback is not None:
+                Clock.schedule_once(lambda dt: callback(result), 0)
+
+        future = self._io.submit(fn)
+        future.add_done_callback(done)
+        return future
+
+    def leaderboard(self):
+        # Открывается при первом обращении — из потока ввода-вывода,
+        # т.к. без файла индекса придётся обойти все профили. accounts()
+        # бэкендов только читает файлы, поэтому обход идёт без замков
+        # store: add() из главного потока его не ждёт
+        if self._leaderboard is None:
+            with self._index_lock:
+                if self._leaderboard is None:
+                    board = Leaderboard.open(self.backend)
+                    for username, data in list(self._data.items()):
+                        if data:
+                            board.set(username, data.get("punkti", 0))
+                    self._leaderboard = board
+        return self._leaderboard
+
+    def _update_rank(self, username):
+        # Поток ввода-вывода. В индекс идёт итог профиля, а не прибавка:
+        # награда, уже учтённая при открытии индекса, не считается дважды
+        self.leaderboard().set(username, self._points(username))
+
+    def _points(self, username):
+        # Очки профиля вместе с ещё не записанными событиями — без
+        # записи на диск, чтобы награда не отменяла отложенную запись
+        with self._lock:
+            data = self._data.get(username)
+            if data:
+                return data.get("punkti") or 0
+            with self._backend_lock:
+                info = self.backend.summary(username)
+            points = (info.get("punkti") or 0) if info else 0
+            for event in self._pending.get(username, ()):
+                if event["type"] == "user_created":
+                    points = event["data"].get("punkti") or 0
+                elif event["type"] == "achievement_awarded":
+                    points += event["data"]["punkti"]
+            return points
+
+    def directory(self):
+        # Открывается из потока ввода-вывода: без файла индекса
+        # придётся один раз обойти все профили (без замков store)
+        if self._directory is None:
+            with self._index_lock:
+                if self._directory is None:
+                    self._directory = UserDirectory.open(self.backend, self.backend_name)
+        return self._directory
+
+    def check_password(self, username, password):
+        # Только из потока ввода-вывода: KDF считается ~KDF_TARGET секунд.
+        # -> имя как при регистрации или None, если имя/пароль неверны
+        directory = self.directory()
+        entry = directory.find(username)
+        if entry is None:
+            with self._backend_lock:
+                if not self.backend.exists(username):
+                    return None
+            # профиль положили в обход каталога — добавляем
+            data = self.get(username)
+            directory.add(username, data.get("email"), data.get("password"),
+                          self.backend_name)
+            entry = directory.find(username)
+        name = entry["username"]
+        ok, rehash = directory.check(name, entry["password"] or "", password)
+        if not ok:
+            return None
+        if rehash:
+            stored = hash_password(password)
+            self.add(name, "user_updated", {"password": stored})
+            self.compact(name)   # старый пароль не должен остаться в снимке
+            directory.set_password(name, stored)
+        return name
+
+    def compact(self, username):
+        # Переписать снимок профиля сразу, не дожидаясь COMPACT_EVERY событий.
+        # В потоке ввода-вывода: между снимком профиля и его записью
+        # не вклинится запись событий
+        if not threading.current_thread().name.startswith(IO_THREAD):
+            return self._io.submit(self.compact, username).result()
+        if not hasattr(self.backend, "compact"):
+            return
+        if self.queryable:
+            # бэкенд сам держит то, что идёт в снимок, — без get()
+            # и чтения всех записей
+            self.flush_user(username)
+            with self._backend_lock:
+                if self.backend.exists(username):
+                    self.backend.compact(username)
+            return
+        snapshot = None
+        while True:
+            self.flush_user(username)
+            with self._lock:
+                if username in self._pending:
+                    continue   # пока писали, добавилось ещё
+                snapshot = profile_snapshot(self.get(username))
+                break
+        if snapshot is not None:
+            with self._backend_lock:
+                self.backend.compact(username, snapshot)
+
+    def _busy(self, username):
+        # Есть события, которых ещё нет на диске (под self._lock)
+        return username in self._pending or username in self._writing
+
+    def get(self, username):
+        if self._busy(username) and username not in self._data:
+            self.flush_user(username)
+        with self._lock:
+            if self._busy(username) and username in self._data:
+                return self._data[username]
+            with self._backend_lock:
+                version = self.backend.version(username)
+                if version is None:
+                    self._data.pop(username, None)
+                    self._version.pop(username, None)
+                    return None
+                if self._version.get(username) != version or username not in self._data:
+                    self._data[username] = data = self.backend.load(username)
+                    self._version[username] = version
+                    self._bump(username)
+                    if self._leaderboard is not None and data:
+                        # сверяем индекс с профилем, если запись индекса отстала
+                        self._leaderboard.set(username, data.get("punkti", 0))
+            return self._data[username]
+
+    def _bump(self, username):
+        self._generation[username] = self._generation.get(username, 0) + 1
+
+    def generation(self, username):
+        # Меняется только когда профиль изменили в обход этого store
+        # (другой процесс, ручная правка файла). Свои add() его не трогают,
+        # поэтому экранам достаточно дорисовать новые записи.
+        with self._lock:
+            if not self._busy(username):
+                with self._backend_lock:
+                    version = self.backend.version(username)
+                if version != self._version.get(username):
+                    self._version[username] = version
+                    self._data.pop(username, None)
+                    self._bump(username)
+            return self._generation.get(username, 0)
+
+    def exists(self, username):
+        # Без учёта регистра: "Andrejs" и "andrejs" — одно имя
+        if self.directory().find(username) is not None:
+            return True
+        with self._lock, self._backend_lock:
+            return self._busy(username) or self.backend.exists(username)
+
+    def create(self, username, record):
+        # Проверка имени и запись профиля под одним замком: двойное нажатие
+        # или "Anna" и "anna" из двух задач не создадут два профиля.
+        # False — имя уже занято
+        self.directory()   # открыть каталог до замка: это обход всех профилей
+        with self._lock:
+            if self.exists(username):
+                return False
+            self.add(username, "user_created", record)
+            self.directory().add(username, record["email"], record["password"],
+                                 self.backend_name)
+            return True
+
+    def add(self, username, kind, record):
+        # Возвращает добавленную запись в виде модели. Записи списков
+        # получают id — по нему синхронизация узнаёт их на других устройствах
+        if kind in EVENT_LISTS and "id" not in record:
+            record = dict(record, id=uuid.uuid4().hex)
+        event = {"type": kind, "data": record}
+        model = None
+        with self._lock:
+            if username in self._data or not self.queryable:
+                data = self.get(username)
+                if data is None:
+                    data = self._data[username] = {}
+                model = apply_event(data, event)
+            self._pending.setdefault(username, []).append(event)
+        if kind in ("user_created", "achievement_awarded"):
+            self.run_async(lambda: self._update_rank(username))
+        self._flush_trigger()
+        if model is None and kind in EVENT_LISTS:
+            model = as_model(EVENT_LISTS[kind], record)
+        return model
+
+    def add_many(self, username, kind, records):
+        # Пачка записей одного списка за один заход под замком; на диск
+        # она уйдёт одним backend.write. Очков не даёт — достижение за
+        # пачку добавляется отдельно. -> число добавленных записей
+        events = [{"type": kind, "data": r if "id" in r else dict(r, id=uuid.uuid4().hex)}
+                  for r in records]
+        with self._lock:
+            if username in self._data or not self.queryable:
+                data = self.get(username)
+                if data is None:
+                    data = self._data[username] = {}
+                for event in events:
+                    apply_event(data, event)
+            self._pending.setdefault(username, []).extend(events)
+        self._flush_trigger()
+        return len(events)
+
+    def rows(self, username, key, offset=0, limit=None):
+        # Записи списка key, новые сверху; за живыми — архив (archive_old),
+        # так что номера записей не зависят от того, что ушло в архив
+        live = self._live_rows(username, key, offset, limit)
+        if limit is not None and len(live) >= limit:
+            return live
+        archived = self.archived(username, key)
+        if not archived:
+            return live
+        stop = archived - max(0, offset - self._live_count(username, key))
+        start = 0 if limit is None else max(0, stop - (limit - len(live)))
+        return live + list(iter_archive(username, key, start, stop))[::-1]
+
+    def archived(self, username, key):
+        # Сколько первых записей списка key в архиве
+        if self.queryable:
+            self.flush_user(username)
+            with self._lock, self._backend_lock:
+                info = self.backend.summary(username)
+        else:
+            with self._lock:
+                info = self.get(username)
+        return info["stats"]["archived"].get(key, 0) if info else 0
+
+    def _live_rows(self, username, key, offset=0, limit=None):
+        if self.queryable:
+            self.flush_user(username)
+            with self._lock, self._backend_lock:
+                return self.backend.rows(username, key, offset, limit)
+        with self._lock:
+            data = self.get(username)
+            items = data.get(key, []) if data else []
+            end = len(items) - offset
+            if end <= 0:
+                return []
+            start = 0 if limit is None else max(0, end - limit)
+            return items[start:end][::-1]
+
+    def tail(self, username, key, start):
+        # Записи key с номерами [start, count) (старые первыми) и count.
+        # Читается страницами по TAIL_PAGE записей без замка store: разбор
+        # всей истории не должен задерживать add() из главного потока.
+        # Номера записей от начала списка не меняются, так что страницы
+        # стыкуются, даже если между ними что-то дописали
+        def read():
+            count = self.count(username, key)
+            records = []
+            for first in range(start, count, TAIL_PAGE):
+                records += self._slice(username, key, first, min(count, first + TAIL_PAGE))
+            return count, records
+        if threading.current_thread().name.startswith(IO_THREAD):
+            return read()
+        return self._io.submit(read).result()
+
+    def expired(self, username, key, before):
+        # Записи key с датой раньше before (date) из начала живого списка,
+        # старые первыми. Список читается страницами по TAIL_PAGE до первой
+        # более новой записи; сегментный бэкенд находит её по индексу и
+        # читает только сами старые записи
+        def read():
+            start = self.archived(username, key)
+            old = None
+            if hasattr(self.backend, "expired"):
+                self.flush_user(username)
+                with self._lock, self._backend_lock:
+                    old = self.backend.expired(username, key, before)
+            if old is not None:
+                records = []
+                for first in range(start, start + old, TAIL_PAGE):
+                    records += self._slice(username, key, first,
+                                           min(start + old, first + TAIL_PAGE))
+                return records
+            count = self.count(username, key)
+            records = []
+            for first in range(start, count, TAIL_PAGE):
+                for r in self._slice(username, key, first, min(count, first + TAIL_PAGE)):
+                    if r.datums is None or r.datums.date() >= before:
+                        return records
+                    records.append(r)
+            return records
+        if threading.current_thread().name.startswith(IO_THREAD):
+            return read()
+        return self._io.submit(read).result()
+
+    def _slice(self, username, key, first, stop):
+        # Записи с номерами [first, stop), старые первыми. rows считает от
+        # новых, поэтому если между подсчётом и чтением список вырос,
+        # страница читается заново; при частых add() — одна страница под
+        # замком, чтобы не читать её бесконечно
+        for _ in range(3):
+            total = self.count(username, key)
+            rows = self.rows(username, key, total - stop, stop - first)
+            if self.count(username, key) == total:
+                return rows[::-1]
+        with self._lock:
+            total = self.count(username, key)
+            return self.rows(username, key, total - stop, stop - first)[::-1]
+
+    def count(self, username, key):
+        return self._live_count(username, key) + self.archived(username, key)
+
+    def _live_count(self, username, key):
+        if self.queryable:
+            self.flush_user(username)
+            with self._lock, self._backend_lock:
+                return self.backend.count(username, key)
+        with self._lock:
+            data = self.get(username)
+            return len(data.get(key, [])) if data else 0
+
+    def find_results(self, username, sport=None, since=None, until=None, limit=None):
+        # Живые результаты (без архива) вида sport с датой в [since, until],
+        # новые сверху. Сегментный бэкенд отбирает их по индексу; остальные
+        # фильтруют список целиком
+        if hasattr(self.backend, "find"):
+            self.flush_user(username)
+            with self._lock, self._backend_lock:
+                return self.backend.find(username, sport, since, until, limit)
+        found = []
+        for r in self._live_rows(username, "rezultati"):
+            day = r.datums.date() if r.datums else None
+            if ((sport is None or r.sport == sport)
+                    and (since is None or (day and day >= since))
+                    and (until is None or (day and day <= until))):
+                found.append(r)
+                if limit is not None and len(found) >= limit:
+                    break
+        return found
+
+    def summary(self, username):
+        # Имя, почта, очки и размеры списков — без самих списков
+        if self.queryable:
+            self.flush_user(username)
+            with self._lock, self._backend_lock:
+                return self.backend.summary(username)
+        with self._lock:
+            data = self.get(username)
+            if data is None:
+                return None
+            info = {key: data.get(key) for key in ("username", "email", "punkti")}
+            info["stats"] = copy.deepcopy(data["stats"])
+            for key in EVENT_LISTS.values():
+                info[key] = info["stats"][key]
+            return info
+
+    def _write_pending(self, username):
+        # События снимаются с очереди под тем же замком, что и add(), вместе
+        # со снимком профиля, который им точно соответствует, а пишутся уже
+        # без него: add() из главного потока не ждёт fsync и сжатие снимка.
+        # Пока пачка пишется, она в _writing и считается незаписанной.
+        # Если запись не удалась (диск полон), события возвращаются в начало
+        # очереди и повторяются через WRITE_RETRY секунд
+        with self._lock:
+            self._scheduled.discard(username)
+            events = self._pending.pop(username, None)
+            if not events:
+                return
+            self._writing[username] = events
+            data = None if self.queryable else profile_snapshot(self._data.get(username))
+        try:
+            with self._backend_lock:
+                self.backend.write(username, data, events)
+                version = self.backend.version(username)
+        except Exception as e:
+            events = events[e.written:] if isinstance(e, PartialWrite) else events
+            with self._lock:
+                del self._writing[username]
+                if events or username in self._pending:
+                    self._pending[username] = events + self._pending.get(username, [])
+            Logger.error("Storage: writing %d events for %s failed, will retry: %s",
+                         len(events), username, e)
+            Clock.schedule_once(self.flush, WRITE_RETRY)
+            return
+        with self._lock:
+            del self._writing[username]
+            self._version[username] = version
+
+    def flush_user(self, username):
+        # Синхронно: всё, что было поставлено в очередь раньше, запишется
+        # первым, так что порядок событий не нарушается. Нельзя вызывать
+        # под self._lock из главного потока — поток записи ждёт этот замок.
+        if threading.current_thread().name.startswith(IO_THREAD):
+            self._write_pending(username)
+        elif self._busy(username):
+            self._io.submit(self._write_pending, username).result()
+
+    def _save_indexes(self):
+        if self._leaderboard is not None:
+            self._leaderboard.save()
+        if self._directory is not None:
+            self._directory.save()
+
+    def flush(self, *_, wait=False):
+        with self._lock:
+            for username in list(self._pending):
+                if username not in self._scheduled:
+                    self._scheduled.add(username)
+                    self._io.submit(self._write_pending, username)
+        self.run_async(self._save_indexes)
+        if wait:
+            self._io.submit(lambda: None).result()
+
+
+# ═══════════════════════════════════════════════════════════
+#  SINHRONIZĀCIJA — обмен новыми записями с сервером
+# ═══════════════════════════════════════════════════════════
+# Передаются только записи, которых сервер ещё не видел: списки только
+# растут, поэтому "отправлено" — это число записей каждого списка, а
+# "получено" — номер последней записи сервера (since). Тело запроса и
+# ответа — JSON в gzip, записей в одном запросе не больше SYNC_BATCH.
+#
+# POST {SYNC_URL}/sync/<username>
+#   {"device": ..., "since": N, "records": [{"key", "id", "data"}, ...], "pull": bool}
+# -> {"records": [...с других устройств после since], "since": M, "more": bool}
+#
+# Сервер узнаёт записи по id; если id уже есть, остаётся запись
+# с более поздним datums. Для проверки — sync_server.py.
+
+SYNC_URL = os.environ.get("SPORTA_SYNC_URL")
+SYNC_BATCH = 200
+SYNC_RETRIES = 4        # попыток на один запрос
+SYNC_BACKOFF = 1.0      # пауза перед повтором, секунды; удваивается
+SYNC_TIMEOUT = 15
+SYNC_KINDS = {key: kind for kind, key in EVENT_LISTS.items()}
+
+
+class SyncError(Exception):
+    pass
+
+
+class SyncClient:
+    # Работает в своём потоке: ожидание сети и паузы между повторами
+    # не должны задерживать запись профилей в потоке ввода-вывода
+    def __init__(self, store, url=None):
+        self.store = store
+        self.url = (url or SYNC_URL or "").rstrip("/")
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sporta-sync")
+
+    def get_state_file(self, username):
+        return os.path.join(DATA_DIR, f"{username}.sync")
+
+    def load_state(self, username):
+        path = self.get_state_file(username)
+        state = {}
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                state = load_json(f.read())
+        state.setdefault("device", uuid.uuid4().hex)
+        state.setdefault("since", 0)
+        state.setdefault("pushed", {key: 0 for key in SYNC_KINDS})
+        state.setdefault("pulled", [])
+        return state
+
+    def save_state(self, username, state):
+        ensure_dir()
+        write_atomic(self.get_state_file(username), dump_json(state))
+
+    def run_async(self, username, callback):
+        # callback((отправлено, получено) или SyncError) — в главном потоке
+        def done(future):
+            try:
+                result = future.result()
+            except SyncError as e:
+                result = e
+            Clock.schedule_once(lambda dt: callback(result), 0)
+        self._worker.submit(self.sync, username).add_done_callback(done)
+
+    def outgoing(self, username, state):
+        # [(key, запись или None)] — всё, что добавлено после прошлой
+        # отправки; None — запись пришла с сервера, назад её не шлём
+        skip = set(state["pulled"])
+        rows = []
+        for key in SYNC_KINDS:
+            start = state["pushed"].get(key, 0)
+            _, records = self.store.tail(username, key, start)
+            for i, record in enumerate(records, start):
+                payload = record.to_dict() if isinstance(record, Record) else dict(record)
+                # у старых записей id нет — номер в списке одинаков на всех устройствах
+                payload.setdefault("id", f"{username}:{key}:{i}")
+                rows.append((key, None if payload["id"] in skip else payload))
+        return rows
+
+    def sync(self, username):
+        if not self.url:
+            raise SyncError("Sinhronizācijas serveris nav iestatīts.")
+        state = self.load_state(username)
+        rows = self.outgoing(username, state)
+        skipped, pulled = state["pulled"], []
+        sent = received = pos = 0
+        while True:
+            chunk = rows[pos:pos + SYNC_BATCH]
+            records = [{"key": key, "id": r["id"], "data": r}
+                       for key, r in chunk if r is not None]
+            # чужие записи запрашиваем, только когда свои уже все отправлены:
+            # иначе сервер вернул бы копии записей, до которых очередь не дошла
+            reply = self.request(username, {"device": state["device"],
+                                            "since": state["since"],
+                                            "records": records,
+                                            "pull": pos + len(chunk) >= len(rows)})
+            # Пачка принята — сдвигаем метки и сохраняем сразу, чтобы
+            # обрыв связи на следующей пачке не заставил повторять эту
+            for key, _ in chunk:
+                state["pushed"][key] = state["pushed"].get(key, 0) + 1
+            pulled += self.apply(username, reply["records"])
+            state["since"] = reply["since"]
+            state["pulled"] = skipped + pulled
+            sent += len(records)
+            received += len(reply["records"])
+            pos += len(chunk)
+            if pos >= len(rows) and not reply.get("more"):
+                break
+            self.store.flush_user(username)
+            self.save_state(username, state)
+        state["pulled"] = pulled
+        # сначала на диск полученные записи, потом метки
+        self.store.flush_user(username)
+        self.save_state(username, state)
+        return sent, received
+
+    def apply(self, username, received):
+        ids = []
+        for item in received:
+            kind = SYNC_KINDS.get(item["key"])
+            if kind is None:
+                continue
+            self.store.add(username, kind, dict(item["data"], id=item["id"]))
+            ids.append(item["id"])
+        return ids
+
+    def request(self, username, body):
+        import urllib.error, urllib.request   # ~40 мс импорта — только при синхронизации
+        raw = gzip.compress(dump_json(body))
+        req = urllib.request.Request(
+            f"{self.url}/sync/{urllib.parse.quote(username)}", data=raw, method="POST",
+            headers={"Content-Type": "application/json", "Content-Encoding": "gzip",
+                     "Accept-Encoding": "gzip"})
+        delay = SYNC_BACKOFF
+        for attempt in range(SYNC_RETRIES):
+            try:
+                with urllib.request.urlopen(req, timeout=SYNC_TIMEOUT) as resp:
+                    data = resp.read()
+                    if resp.headers.get("Content-Encoding") == "gzip":
+                        data = gzip.decompress(data)
+                    return load_json(data)
+            except urllib.error.HTTPError as e:
+                if e.code < 500:
+                    raise SyncError(f"Serveris atteica: {e.code}") from e
+                error = e
+            except (OSError, ValueError) as e:
+                # нет сети, обрыв, таймаут, недочитанный ответ
+                error = e
+            if attempt + 1 < SYNC_RETRIES:
+                Logger.info("Sync: %s, retry in %.0f s", error, delay)
+                time.sleep(delay)
+                delay *= 2
+        raise SyncError("Nav savienojuma ar serveri.") from error
+
+
+# ═══════════════════════════════════════════════════════════
+#  IMPORTS UN EKSPORTS — результаты и вызовы из CSV / JSONL
+# ═══════════════════════════════════════════════════════════
+# Файл читается построчно генераторами, в памяти — не больше одной
+# пачки IMPORT_BATCH записей; каждая пачка пишется одним backend.write.
+# Проверки те же, что в окнах добавления (check_result / check_challenge).
+# Достижение за импорт одно на весь файл, очки — как за каждую запись.
+# CSV — с заголовком, колонки как SQL_COLUMNS (плюс необязательный id).
+#   python bulk_io.py import <lietotājs> rezultati dati.csv
+
+IMPORT_BATCH = 5000
+IMPORT_ERRORS = 20      # сколько ошибочных строк перечислить в отчёте
+EXPORT_PAGE = 1000
+
+IMPORT_EVENTS = {
+    "rezultati":    "result_added",
+    "izaicinajumi": "challenge_created",
+}
+# Достижение за импорт: заголовок и очки за одну запись (как в окнах)
+IMPORT_AWARDS = {
+    "rezultati":    ("Rezultāti importēti!", "Importēti rezultāti: {n}", 10),
+    "izaicinajumi": ("Izaicinājumi importēti!", "Importēti izaicinājumi: {n}", 20),
+}
+
+
+def check_result(record):
+    # -> текст ошибки или None
+    if not record.get("sport"):
+        return "Izvēlieties sportu!"
+    value = record.get("value", "")
+    if not value:
+        return "Ievadiet rezultātu!"
+    if parse_number(value) is None:
+        return "Rezultātam jābūt skaitlim!"
+    return None
+
+def check_challenge(record):
+    if not record.get("title"):
+        return "Ievadiet nosaukumu!"
+    if not record.get("sport"):
+        return "Izvēlieties sportu!"
+    return None
+
+IMPORT_CHECKS = {
+    "rezultati":    check_result,
+    "izaicinajumi": check_challenge,
+}
+
+
+def import_date(text, fmt):
+    # Дата из чужого трекера (ISO или без времени) -> формат профиля;
+    # нераспознанная остаётся как есть и попадёт в extra модели
+    parsed = parse_time(text, fmt)
+    if parsed is not None:
+        return text
+    parsed = parse_time(text, DATETIME_FMT) or parse_time(text, DATE_FMT)
+    if parsed is None:
+        try:
+            parsed = datetime.fromisoformat(text)
+        except (TypeError, ValueError):
+            return text
+    return parsed.strftime(fmt)
+
+
+def iter_csv(path):
+    # utf-8-sig — Excel сохраняет CSV с BOM
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            yield line, row
+
+def iter_jsonl(path):
+    with open(path, "rb") as f:
+        for line, raw in enumerate(f, start=1):
+            if not raw.strip():
+                continue
+            try:
+                row = load_json(raw)
+            except ValueError:
+                row = None
+            yield line, row if isinstance(row, dict) else None
+
+def iter_import(path, key):
+    # -> (номер строки, запись или None, текст ошибки или None)
+    rows = iter_jsonl(path) if path.endswith(".jsonl") else iter_csv(path)
+    fields = SQL_COLUMNS[key]
+    date_fmt = DATETIME_FMT if key == "rezultati" else DATE_FMT
+    check = IMPORT_CHECKS[key]
+    for line, row in rows:
+        if row is None:
+            yield line, None, "Bojāta rinda"
+            continue
+        record = {f: str(row.get(f) or "").strip() for f in fields}
+        record["datums"] = import_date(record["datums"], date_fmt)
+        if row.get("id"):
+            record["id"] = str(row["id"])
+        error = check(record)
+        yield line, None if error else record, error
+
+
+def import_records(store, username, key, path):
+    # -> {"imported": N, "skipped": M, "errors": [(строка, текст), ...]}
+    kind = IMPORT_EVENTS[key]
+    report = {"imported": 0, "skipped": 0, "errors": []}
+    batch = []
+    for line, record, error in iter_import(path, key):
+        if error:
+            report["skipped"] += 1
+            if len(report["errors"]) < IMPORT_ERRORS:
+                report["errors"].append((line, error))
+            continue
+        batch.append(record)
+        if len(batch) == IMPORT_BATCH:
+            report["imported"] += store.add_many(username, kind, batch)
+            store.flush_user(username)
+            batch = []
+    if batch:
+        report["imported"] += store.add_many(username, kind, batch)
+    n = report["imported"]
+    if n:
+        title, description, punkti = IMPORT_AWARDS[key]
+        add_achievement(store, username, title, description.format(n=n), punkti * n)
+    store.flush_user(username)
+    if n:
+        award_challenges(store, username)
+        award_rules(store, username, [(kind, None), ("achievement_awarded", None)])
+        store.flush_user(username)
+    return report
+
+
+def iter_export(store, username, key):
+    # Старые первыми, страницами по EXPORT_PAGE через store.rows
+    total = store.count(username, key)
+    done = 0
+    while done < total:
+        offset = max(0, total - done - EXPORT_PAGE)
+        page = store.rows(username, key, offset, total - done - offset)
+        for model in reversed(page):
+            yield as_model(key, model)
+        done = total - offset
+
+def export_records(store, username, key, path):
+    # -> число записей; формат по расширению (.jsonl или CSV)
+    n = 0
+    tmp = path + ".tmp"
+    if path.endswith(".jsonl"):
+        with open(tmp, "wb") as f:
+            for model in iter_export(store, username, key):
+                f.write(dump_json(model.to_dict()) + b"\n")
+                n += 1
+    else:
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, SQL_COLUMNS[key] + ("id",), extrasaction="ignore")
+            writer.writeheader()
+            for model in iter_export(store, username, key):
+                writer.writerow(model.to_dict())
+                n += 1
+    os.replace(tmp, path)
+    return n
+
+
+# ═══════════════════════════════════════════════════════════
+#  ANALĪTIKA — тенденции по видам спорта
+# ═══════════════════════════════════════════════════════════
+# Результаты пользователя держатся колонками: значение, день
+# (date.toordinal), месяц (год * 12 + месяц) и код вида спорта.
+# Новые записи дописываются в колонки через store.tail, так что после
+# первой загрузки пересчёт идёт по готовым массивам. С NumPy (если
+# установлен) — векторно, без него — те же расчёты циклами.
+
+numpy = None            # модуль после load_numpy(), если он установлен
+_numpy_loaded = False
+
+
+def load_numpy():
+    # Импорт NumPy — около сотни миллисекунд, поэтому не при запуске, а при
+    # первом Analytics.stats (в потоке ввода-вывода). -> модуль или None
+    global numpy, _numpy_loaded
+    if not _numpy_loaded:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy_loaded = True
+    return numpy
+
+STATS_WEEKS = 12        # столбцов в недельном графике
+STATS_MONTHS = 12
+ROLLING_WINDOW = 5      # скользящее среднее — по последним N результатам
+
+
+class ResultColumns:
+    def __init__(self, generation):
+        self.generation = generation
+        self.count = 0       # сколько записей списка уже прочитано
+        # array.array: дописывать так же дёшево, как в list, а NumPy
+        # читает их буфер без копирования
+        self.values = array("d")
+        self.days = array("q")
+        self.months = array("q")
+        self.codes = array("q")
+        self.names = []      # код -> вид спорта
+        self.units = []      # код -> единица последнего результата
+        self._index = {}
+        self._arrays = None
+
+    def extend(self, records, count):
+        # Записи без числа или даты в графики не попадают. Представления
+        # NumPy снимаются заранее: пока они есть, буфер нельзя расширить
+        self._arrays = None
+        for r in records:
+            if r.value is None or r.datums is None:
+                continue
+            code = self._index.get(r.sport)
+            if code is None:
+                code = self._index[r.sport] = len(self.names)
+                self.names.append(r.sport)
+                self.units.append(r.unit)
+            elif r.unit:
+                self.units[code] = r.unit
+            day = r.datums.date()
+            self.values.append(r.value)
+            self.days.append(day.toordinal())
+            self.months.append(day.year * 12 + day.month - 1)
+            self.codes.append(code)
+        self.count = count
+
+    def code(self, sport):
+        return self._index.get(sport)
+
+    def arrays(self):
+        # Представления NumPy поверх тех же буферов, без копирования
+        if self._arrays is None:
+            self._arrays = (numpy.frombuffer(self.values, dtype=numpy.float64),
+                            numpy.frombuffer(self.days, dtype=numpy.int64),
+                            numpy.frombuffer(self.months, dtype=numpy.int64),
+                            numpy.frombuffer(self.codes, dtype=numpy.int64))
+        return self._arrays
+
+
+def _stats_numpy(cols, today):
+    values, days, months, codes = cols.arrays()
+    n = len(cols.names)
+    week = (days - 1) // 7     # ordinal 1 — понедельник
+    rel = (today - 1) // 7 - week
+    recent = (rel >= 0) & (rel < STATS_WEEKS)
+    weeks = numpy.bincount(codes[recent] * STATS_WEEKS + (STATS_WEEKS - 1 - rel[recent]),
+                           weights=values[recent], minlength=n * STATS_WEEKS)
+    this_month = date.fromordinal(today).year * 12 + date.fromordinal(today).month - 1
+    rel = this_month - months
+    recent = (rel >= 0) & (rel < STATS_MONTHS)
+    month_totals = numpy.bincount(codes[recent] * STATS_MONTHS + (STATS_MONTHS - 1 - rel[recent]),
+                                  weights=values[recent], minlength=n * STATS_MONTHS)
+    counts = numpy.bincount(codes, minlength=n)
+    totals = numpy.bincount(codes, weights=values, minlength=n)
+    best = numpy.full(n, -numpy.inf)
+    numpy.maximum.at(best, codes, values)
+
+    # По виду спорта, внутри — по дате: у каждого вида свой отрезок,
+    # суммы окон — разности префиксных сумм
+    order = numpy.argsort(codes * (1 << 22) + days, kind="stable")
+    prefix = numpy.concatenate(([0.0], numpy.cumsum(values[order])))
+    ends = numpy.cumsum(counts)
+    k = numpy.minimum(counts, ROLLING_WINDOW)
+    avg = (prefix[ends] - prefix[ends - k]) / numpy.maximum(k, 1)
+    k2 = numpy.minimum(counts - k, ROLLING_WINDOW)
+    prev = (prefix[ends - k] - prefix[ends - k - k2]) / numpy.maximum(k2, 1)
+
+    return [{
+        "sport": cols.names[i], "unit": cols.units[i], "count": int(counts[i]),
+        "total": float(totals[i]), "best": float(best[i]), "avg": float(avg[i]),
+        "prev_avg": float(prev[i]) if k2[i] else None,
+        "weeks": weeks[i * STATS_WEEKS:(i + 1) * STATS_WEEKS].tolist(),
+        "months": month_totals[i * STATS_MONTHS:(i + 1) * STATS_MONTHS].tolist(),
+    } for i in range(n)]
+
+
+def _stats_python(cols, today):
+    n = len(cols.names)
+    this_week = (today - 1) // 7
+    t = date.fromordinal(today)
+    this_month = t.year * 12 + t.month - 1
+    weeks = [[0.0] * STATS_WEEKS for _ in range(n)]
+    month_totals = [[0.0] * STATS_MONTHS for _ in range(n)]
+    by_sport = [[] for _ in range(n)]
+    for value, day, month, code in zip(cols.values, cols.days, cols.months, cols.codes):
+        rel = this_week - (day - 1) // 7
+        if 0 <= rel < STATS_WEEKS:
+            weeks[code][STATS_WEEKS - 1 - rel] += value
+        rel = this_month - month
+        if 0 <= rel < STATS_MONTHS:
+            month_totals[code][STATS_MONTHS - 1 - rel] += value
+        by_sport[code].append((day, value))
+
+    sports = []
+    for i, rows in enumerate(by_sport):
+        rows.sort(key=itemgetter(0))   # при равных днях — порядок добавления, как в NumPy
+        prefix = [0.0]
+        for _, value in rows:
+            prefix.append(prefix[-1] + value)
+        end = len(rows)
+        k = min(end, ROLLING_WINDOW)
+        k2 = min(end - k, ROLLING_WINDOW)
+        sports.append({
+            "sport": cols.names[i], "unit": cols.units[i], "count": end,
+            "total": prefix[end], "best": max(v for _, v in rows),
+            "avg": (prefix[end] - prefix[end - k]) / k,
+            "prev_avg": (prefix[end - k] - prefix[end - k - k2]) / k2 if k2 else None,
+            "weeks": weeks[i], "months": month_totals[i],
+        })
+
+    return sports
+
+
+class Analytics:
+    # Колонки и последний расчёт на пользователя. Вызывается из потока
+    # ввода-вывода; пересчёт — только если изменились данные или день.
+    def __init__(self, store):
+        self.store = store
+        self._columns = {}   # username -> ResultColumns
+        self._cache = {}     # username -> (версия данных, результат)
+
+    def columns(self, username):
+        store = self.store
+        generation = store.generation(username)
+        cols = self._columns.get(username)
+        if cols is None or cols.generation != generation:
+            cols = self._columns[username] = ResultColumns(generation)
+        count, records = store.tail(username, "rezultati", cols.count)
+        if count < cols.count:
+            # список стал короче (архив, правка) — читаем заново
+            cols = self._columns[username] = ResultColumns(generation)
+            count, records = store.tail(username, "rezultati", 0)
+        if records:
+            cols.extend(records, count)
+        return cols
+
+    def stats(self, username, today=None):
+        today = (today or date.today()).toordinal()
+        cols = self.columns(username)
+        # Прогресс вызовов — тот же, что на вкладке Izaicinājumi:
+        # из stats["challenges"], а не пересчётом по колонкам
+        info = self.store.summary(username)
+        done = info["stats"]["challenges"]["done"] if info else {}
+        challenges = [{
+            "title": ch.title, "sport": ch.sport, "unit": ch.unit,
+            "target": ch.target, "done": done.get(challenge_key(ch), 0.0),
+            "deadline": ch.deadline.strftime(DATE_FMT) if ch.deadline else "",
+        } for ch in self.store.rows(username, "izaicinajumi") if ch.target]
+        version = (cols.generation, cols.count, today)
+        cached = self._cache.get(username)
+        if cached is not None and cached[0] == version:
+            if cached[1]["challenges"] == challenges:
+                return cached[1]
+            result = dict(cached[1], challenges=challenges)
+        else:
+            load_numpy()
+            t = time.perf_counter()
+            if not cols.values:
+                sports = []
+            elif numpy is not None:
+                sports = _stats_numpy(cols, today)
+            else:
+                sports = _stats_python(cols, today)
+            sports.sort(key=lambda s: -s["count"])
+            result = {"count": len(cols.values), "sports": sports, "challenges": challenges,
+                      "ms": (time.perf_counter() - t) * 1000}
+        self._cache[username] = (version, result)
+        return result
+
 
 # ═══════════════════════════════════════════════════════════
 #  STILS — общие цвета и хелперы для виджетов
@@ -101,10 +2962,15 @@ def make_label(text, font_size=16, color=TEXT_PRIMARY, bold=False,
         halign=halign,
         text_size=(None, None)
     )
-    lbl.bind(size=lambda inst, val: setattr(inst, "text_size", (val[0], None)))
+    lbl.bind(size=wrap_text)
     return lbl
 
 
+def wrap_text(label, size):
+    # Перенос строк по ширине; одна функция на все метки вместо лямбды на каждую
+    label.text_size = (size[0], None)
+
+
 def make_input(hint="", password=False, height=44):
     return TextInput(
         hint_text=hint,
@@ -135,6 +3001,7 @@ def make_scrollable_box(spacing=10, padding=20):
 
 
 def show_popup(title, message, ok_text="Labi"):
+    from kivy.uix.popup import Popup   # не нужен для первого кадра
     content = BoxLayout(orientation="vertical", padding=20, spacing=10)
     content.add_widget(Label(text=message, color=TEXT_PRIMARY, font_size=15))
     btn = make_button(ok_text, height=44)
@@ -153,13 +3020,461 @@ def show_popup(title, message, ok_text="Labi"):
     popup.open()
     return popup
 
+def show_io_error(error):
+    # Ошибка фонового чтения/записи (run_async без своего on_error)
+    show_popup("Kļūda", f"Neizdevās nolasīt vai saglabāt datus.\n{error}")
+
 
 def set_bg(widget, color):
+    # Повторный вызов только меняет цвет — второй прямоугольник не рисуется
+    if hasattr(widget, "bg_color"):
+        widget.bg_color.rgba = color
+        return
     with widget.canvas.before:
-        Color(*color)
-        rect = Rectangle(size=widget.size, pos=widget.pos)
-    widget.bind(size=lambda w, v: setattr(rect, "size", v))
-    widget.bind(pos=lambda w, v: setattr(rect, "pos", v))
+        widget.bg_color = Color(*color)
+        widget.bg_rect = Rectangle(size=widget.size, pos=widget.pos)
+    widget.bind(size=_sync_bg, pos=_sync_bg)
+
+
+def _sync_bg(widget, _):
+    widget.bg_rect.pos = widget.pos
+    widget.bg_rect.size = widget.size
+
+
+# ═══════════════════════════════════════════════════════════
+#  SARAKSTI — карточки для RecycleView
+# ═══════════════════════════════════════════════════════════
+# Создаётся только столько карточек, сколько видно на экране;
+# при прокрутке RecycleView подставляет в них новые данные.
+
+class EmptyRow(RecycleDataViewBehavior, Label):
+    def __init__(self, **kwargs):
+        super().__init__(font_size=16, color=TEXT_SECONDARY,
+                         halign="center", **kwargs)
+        self.bind(size=wrap_text)
+
+Factory.register("EmptyRow", cls=EmptyRow)
+
+
+class ChallengeCard(RecycleDataViewBehavior, BoxLayout):
+    height_px = 100
+
+    def __init__(self, **kwargs):
+        super().__init__(orientation="vertical", padding=[15, 10], spacing=4, **kwargs)
+        set_bg(self, CARD_COLOR)
+
+        top = BoxLayout(size_hint=(1, None), height=28)
+        self.title_label = Label(markup=True, font_size=16, color=ACCENT,
+                                 size_hint=(0.7, 1), halign="left")
+        self.sport_label = Label(font_size=13, color=ACCENT2,
+                                 size_hint=(0.3, 1), halign="right")
+        top.add_widget(self.title_label)
+        top.add_widget(self.sport_label)
+        self.add_widget(top)
+
+        self.desc_label = make_label("", font_size=13, color=TEXT_SECONDARY, height=22)
+        self.add_widget(self.desc_label)
+
+        self.bottom_label = Label(font_size=12, color=TEXT_SECONDARY,
+                                  size_hint=(1, None), height=22, halign="left")
+        self.bottom_label.bind(size=wrap_text)
+        self.add_widget(self.bottom_label)
+
+    def refresh_view_attrs(self, rv, index, data):
+        record = data["record"]
+        ch = record.to_dict()
+        self.title_label.text = f"[b]{ch['title']}[/b]"
+        self.sport_label.text = ch["sport"]
+        self.desc_label.text = ch.get("description", "")
+        # rv.progress: ключ вызова -> (сумма, выполнен) из stats профиля
+        progress = getattr(rv, "progress", {}).get(challenge_key(record))
+        if progress is None:
+            goal = f"Mērķis: {ch.get('target', '')} {ch.get('unit', '')}"
+        elif progress[1]:
+            goal = f"Izpildīts! {ch['target']} {ch.get('unit', '')}"
+        else:
+            goal = (f"Progress: {format_number(round(progress[0], 2))} / "
+                    f"{ch['target']} {ch.get('unit', '')}"
+                    f" ({progress[0] * 100 / record.target:.0f}%)")
+        self.bottom_label.text = f"{goal}  |  Termiņš: {ch.get('deadline', 'Nav')}"
+
+
+class ResultCard(RecycleDataViewBehavior, BoxLayout):
+    height_px = 72
+
+    def __init__(self, **kwargs):
+        super().__init__(orientation="horizontal", padding=[15, 8], spacing=10, **kwargs)
+        set_bg(self, CARD_COLOR)
+
+        left = BoxLayout(orientation="vertical", size_hint=(0.75, 1))
+        self.sport_label = Label(markup=True, font_size=15, color=TEXT_PRIMARY,
+                                 size_hint=(1, None), height=24, halign="left")
+        self.note_label = Label(font_size=12, color=TEXT_SECONDARY,
+                                size_hint=(1, None), height=20, halign="left")
+        left.add_widget(self.sport_label)
+        left.add_widget(self.note_label)
+        self.add_widget(left)
+
+        self.value_label = Label(markup=True, font_size=18, color=ACCENT2,
+                                 size_hint=(0.25, 1), halign="right")
+        self.add_widget(self.value_label)
+
+    def refresh_view_attrs(self, rv, index, data):
+        r = data["record"].to_dict()
+        self.sport_label.text = f"[b]{r['sport']}[/b]"
+        note = r.get("note", "")
+        self.note_label.text = note if note else r.get("datums", "")
+        self.value_label.text = f"[b]{r['value']} {r.get('unit','')}[/b]"
+
+
+class AchievementCard(RecycleDataViewBehavior, BoxLayout):
+    height_px = 70
+
+    def __init__(self, **kwargs):
+        super().__init__(orientation="horizontal", padding=[15, 8], spacing=12, **kwargs)
+        set_bg(self, CARD_COLOR)
+
+        self.add_widget(Label(text="P", font_size=28, size_hint=(None, 1), width=40))
+
+        info = BoxLayout(orientation="vertical", size_hint=(0.7, 1))
+        self.title_label = Label(markup=True, font_size=14, color=TEXT_PRIMARY,
+                                 size_hint=(1, None), height=24, halign="left")
+        self.desc_label = Label(font_size=11, color=TEXT_SECONDARY,
+                                size_hint=(1, None), height=18, halign="left")
+        info.add_widget(self.title_label)
+        info.add_widget(self.desc_label)
+        self.add_widget(info)
+
+        self.pts_label = Label(markup=True, font_size=16, color=ACCENT2,
+                               size_hint=(0.22, 1), halign="right")
+        self.add_widget(self.pts_label)
+
+    def refresh_view_attrs(self, rv, index, data):
+        ach = data["record"].to_dict()
+        self.title_label.text = f"[b]{ach['title']}[/b]"
+        self.desc_label.text = ach.get("description", "")
+        self.pts_label.text = f"[b]+{ach['punkti']}[/b]"
+
+
+class LeaderRow(RecycleDataViewBehavior, BoxLayout):
+    height_px = 52
+
+    def __init__(self, **kwargs):
+        super().__init__(orientation="horizontal", padding=[15, 6], spacing=10, **kwargs)
+        set_bg(self, CARD_COLOR)
+        self.place_label = Label(markup=True, font_size=16, color=ACCENT,
+                                 size_hint=(None, 1), width=50)
+        self.name_label = Label(font_size=15, size_hint=(0.65, 1), halign="left")
+        self.name_label.bind(size=wrap_text)
+        self.pts_label = Label(markup=True, font_size=16, color=ACCENT2,
+                               size_hint=(0.35, 1), halign="right")
+        self.add_widget(self.place_label)
+        self.add_widget(self.name_label)
+        self.add_widget(self.pts_label)
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.place_label.text = f"[b]{data['place']}.[/b]"
+        self.name_label.text = data["username"]
+        self.name_label.color = ACCENT2 if data["me"] else TEXT_PRIMARY
+        self.pts_label.text = f"[b]{data['punkti']}[/b]"
+
+
+def make_recycle_list(viewclass, spacing=8, padding=(15, 0, 15, 15)):
+    rv = RecycleView(size_hint=(1, 1), do_scroll_x=False)
+    layout = RecycleBoxLayout(
+        orientation="vertical",
+        size_hint_y=None,
+        default_size=(None, viewclass.height_px),
+        default_size_hint=(1, None),
+        spacing=spacing,
+        padding=list(padding),
+        key_viewclass="viewclass"
+    )
+    layout.bind(minimum_height=layout.setter("height"))
+    rv.add_widget(layout)
+    rv.viewclass = viewclass
+    return rv
+
+
+def show_loading(rv):
+    rv.data = [{"viewclass": "EmptyRow", "text": "Ielādē...", "height": 40}]
+
+
+@traced
+def show_records(rv, records, empty_text):
+    if records:
+        rv.data = [{"record": r} for r in records]
+    else:
+        rv.data = [{"viewclass": "EmptyRow", "text": empty_text, "height": 40}]
+
+
+PAGE_SIZE = 30        # записей за один запрос к хранилищу
+
+
+class RecordList:
+    # Помнит, сколько записей уже показано в RecycleView: при
+    # обновлении сверху добавляются только новые, а если данные не
+    # менялись — не делается ничего. Из хранилища читается только
+    # первая страница, следующие — когда список докрутили до низа.
+    def __init__(self, rv, key, empty_text):
+        self.rv = rv
+        self.key = key
+        self.empty_text = empty_text
+        self._store = None
+        self._shown = None   # (username, generation)
+        self._count = 0      # записей в хранилище
+        self._loaded = 0     # из них уже в rv.data
+        self._loading = False
+        rv.bind(scroll_y=self._on_scroll)
+
+    @traced
+    def refresh(self, store, username):
+        self._store = store
+        if not username:
+            self.rv.data = []
+            self._shown, self._count, self._loaded = None, 0, 0
+            return
+        if self._shown is None or self._shown[0] != username:
+            show_loading(self.rv)
+            self._shown, self._count, self._loaded = None, 0, 0
+        shown, shown_count = self._shown, self._count
+
+        def fetch():   # поток ввода-вывода
+            count = store.count(username, self.key)
+            state = (username, store.generation(username))
+            if state == shown and count == shown_count:
+                return None
+            # новых больше страницы — вставлять их все сверху незачем,
+            # перечитываем первую страницу
+            if (state == shown and shown_count > 0
+                    and shown_count < count <= shown_count + PAGE_SIZE):
+                return state, count, store.rows(username, self.key,
+                                                limit=count - shown_count), True
+            return state, count, store.rows(username, self.key,
+                                            limit=PAGE_SIZE), False
+
+        def apply(result):   # главный поток
+            if (self._shown, self._count) != (shown, shown_count):
+                # пока читали, список уже дорисовали — читаем заново
+                self.refresh(store, username)
+                return
+            if result is None:
+                return
+            state, count, rows, incremental = result
+            if incremental:
+                for r in reversed(rows):
+                    self.rv.data.insert(0, {"record": r})
+                self._loaded += len(rows)
+            else:
+                show_records(self.rv, rows, self.empty_text)
+                self._loaded = len(rows)
+            self._shown, self._count = state, count
+
+        store.run_async(fetch, apply)
+
+    def load_more(self):
+        # Следующая страница: смещение — сколько записей уже показано
+        if self._shown is None or self._loading or self._loaded >= self._count:
+            return
+        store, key = self._store, self.key
+        shown, loaded = self._shown, self._loaded
+        self._loading = True
+
+        def apply(rows):
+            self._loading = False
+            if (self._shown, self._loaded) != (shown, loaded):
+                return   # список успел поменяться — дочитаем при следующей прокрутке
+            self.rv.data.extend({"record": r} for r in rows)
+            self._loaded += len(rows)
+
+        store.run_async(lambda: store.rows(shown[0], key, offset=loaded,
+                                           limit=PAGE_SIZE), apply)
+
+    def _on_scroll(self, rv, scroll_y):
+        # scroll_y: 1 — верх, 0 — низ; подгружаем, когда до конца
+        # осталось меньше одного экрана
+        hidden = rv.children[0].height - rv.height if rv.children else 0
+        if hidden > 0 and scroll_y * hidden < rv.height:
+            self.load_more()
+
+    def prepend(self, store, username, record):
+        # Запись уже добавлена в store — дорисовываем одну карточку.
+        # generation() читает версию файлов, поэтому спрашивается в потоке
+        # ввода-вывода, а карточка добавляется по ответу
+        expected = self._shown, self._count
+
+        def apply(generation):   # главный поток
+            if (self._shown, self._count) != expected:
+                # пока спрашивали, список перерисовали — возможно, уже с ней
+                self.refresh(store, username)
+            elif self._shown == (username, generation):
+                self._insert(record)
+            # иначе список и так перерисуется при следующем refresh
+
+        store.run_async(lambda: store.generation(username), apply)
+
+    def _insert(self, record):
+        if self._count == 0:
+            self.rv.data = [{"record": record}]
+        else:
+            self.rv.data.insert(0, {"record": record})
+        self._count += 1
+        self._loaded += 1
+
+
+class CardPool:
+    # Для коротких списков вне RecycleView: снятые с экрана карточки
+    # не выбрасываются, а получают новые данные через set_data
+    def __init__(self, factory):
+        self.factory = factory
+        self._free = []
+
+    def fill(self, container, items):
+        for child in list(container.children):
+            container.remove_widget(child)
+            if isinstance(child, self.factory):
+                self._free.append(child)
+        for item in items:
+            card = self._free.pop() if self._free else self.factory()
+            card.set_data(item)
+            container.add_widget(card)
+
+
+class StatCard(BoxLayout):
+    def __init__(self, **kwargs):
+        super().__init__(orientation="vertical", size_hint=(1, None),
+                         height=72, padding=[10, 8], **kwargs)
+        set_bg(self, CARD_COLOR)
+        self.value_label = Label(markup=True, font_size=22, color=ACCENT,
+                                 size_hint=(1, None), height=30)
+        self.caption_label = Label(font_size=12, color=TEXT_SECONDARY,
+                                   size_hint=(1, None), height=20)
+        self.add_widget(self.value_label)
+        self.add_widget(self.caption_label)
+
+    def set_data(self, item):
+        icon, label, value = item
+        self.value_label.text = f"[b]{value}[/b]"
+        self.caption_label.text = f"{icon} {label}"
+
+
+class HistoryRow(BoxLayout):
+    def __init__(self, **kwargs):
+        super().__init__(size_hint=(1, None), height=40, padding=[12, 5], **kwargs)
+        set_bg(self, CARD_COLOR)
+        self.sport_label = Label(font_size=14, color=TEXT_PRIMARY,
+                                 size_hint=(0.5, 1), halign="left")
+        self.value_label = Label(font_size=14, color=ACCENT2,
+                                 size_hint=(0.3, 1), halign="right")
+        self.date_label = Label(font_size=11, color=TEXT_SECONDARY,
+                                size_hint=(0.2, 1), halign="right")
+        self.add_widget(self.sport_label)
+        self.add_widget(self.value_label)
+        self.add_widget(self.date_label)
+
+    def set_data(self, r):
+        self.sport_label.text = r.sport
+        self.value_label.text = f"{format_number(r.value)} {r.unit}"
+        self.date_label.text = r.datums.strftime(DATE_FMT) if r.datums else ""
+
+
+class BarChart(Widget):
+    # Столбики по значениям; перерисовывается при смене данных или размера
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.values = []
+        self.bind(pos=self._draw, size=self._draw)
+
+    def set_values(self, values):
+        self.values = values
+        self._draw()
+
+    def _draw(self, *_):
+        self.canvas.clear()
+        top = max(self.values, default=0)
+        if top <= 0:
+            return
+        w = self.width / len(self.values)
+        with self.canvas:
+            Color(*ACCENT2)
+            for i, v in enumerate(self.values):
+                if v > 0:
+                    Rectangle(pos=(self.x + i * w + 1, self.y),
+                              size=(max(1, w - 2), self.height * v / top))
+
+
+class SportStatsCard(BoxLayout):
+    def __init__(self, **kwargs):
+        super().__init__(orientation="vertical", size_hint=(1, None),
+                         height=140, padding=[12, 8], spacing=4, **kwargs)
+        set_bg(self, CARD_COLOR)
+        top = BoxLayout(size_hint=(1, None), height=24)
+        self.sport_label = Label(markup=True, font_size=15, color=TEXT_PRIMARY,
+                                 size_hint=(0.6, 1), halign="left")
+        self.count_label = Label(font_size=12, color=TEXT_SECONDARY,
+                                 size_hint=(0.4, 1), halign="right")
+        top.add_widget(self.sport_label)
+        top.add_widget(self.count_label)
+        self.add_widget(top)
+        self.numbers_label = Label(font_size=12, color=TEXT_SECONDARY,
+                                   size_hint=(1, None), height=20, halign="left")
+        self.numbers_label.bind(size=wrap_text)
+        self.add_widget(self.numbers_label)
+        self.chart = BarChart(size_hint=(1, 1))
+        self.add_widget(self.chart)
+        self.add_widget(make_label(f"Pēdējās {STATS_WEEKS} nedēļas", font_size=10,
+                                   color=TEXT_SECONDARY, height=14, halign="right"))
+
+    def set_data(self, s):
+        unit = s["unit"]
+        trend = ""
+        if s["prev_avg"] is not None:
+            trend = " ↑" if s["avg"] > s["prev_avg"] else " ↓" if s["avg"] < s["prev_avg"] else ""
+        self.sport_label.text = f"[b]{s['sport']}[/b]"
+        self.count_label.text = f"{s['count']} rezultāti"
+        self.numbers_label.text = (
+            f"Kopā: {format_number(round(s['total'], 2))} {unit}  |  "
+            f"Labākais: {format_number(s['best'])}  |  "
+            f"Vidēji ({ROLLING_WINDOW}): {format_number(round(s['avg'], 2))}{trend}")
+        self.chart.set_values(s["weeks"])
+
+
+class ProgressRow(BoxLayout):
+    def __init__(self, **kwargs):
+        from kivy.uix.progressbar import ProgressBar
+        super().__init__(orientation="vertical", size_hint=(1, None),
+                         height=66, padding=[12, 6], spacing=2, **kwargs)
+        set_bg(self, CARD_COLOR)
+        self.title_label = Label(markup=True, font_size=14, color=ACCENT,
+                                 size_hint=(1, None), height=20, halign="left")
+        self.title_label.bind(size=wrap_text)
+        self.bar = ProgressBar(max=100, size_hint=(1, None), height=14)
+        self.done_label = Label(font_size=11, color=TEXT_SECONDARY,
+                                size_hint=(1, None), height=18, halign="left")
+        self.done_label.bind(size=wrap_text)
+        self.add_widget(self.title_label)
+        self.add_widget(self.bar)
+        self.add_widget(self.done_label)
+
+    def set_data(self, ch):
+        percent = min(100.0, ch["done"] * 100 / ch["target"])
+        self.title_label.text = f"[b]{ch['title']}[/b]  ({ch['sport']})"
+        self.bar.value = percent
+        deadline = f"  |  Termiņš: {ch['deadline']}" if ch["deadline"] else ""
+        self.done_label.text = (f"{format_number(round(ch['done'], 2))} / "
+                                f"{format_number(ch['target'])} {ch['unit']}"
+                                f"  ({percent:.0f}%){deadline}")
+
+
+def make_list_header(*widgets, spacing=10, padding=(15, 15, 15, 10)):
+    # Кнопки и подпись над списком — не прокручиваются вместе с ним
+    box = BoxLayout(orientation="vertical", size_hint=(1, None),
+                    spacing=spacing, padding=list(padding))
+    box.height = (sum(w.height for w in widgets) + spacing * (len(widgets) - 1)
+                  + padding[1] + padding[3])
+    for w in widgets:
+        box.add_widget(w)
+    return box
 
 
 # ═══════════════════════════════════════════════════════════
@@ -180,6 +3495,8 @@ class NavBar(BoxLayout):
             ("results", "Rezultāti",    "results"),
             ("points", "Punkti",       "points"),
             ("profile", "Profils",      "profile"),
+            ("leaderboard", "Līderi",   "leaderboard"),
+            ("stats", "Statistika",     "stats"),
         ]
         for icon, label, screen in tabs:
             btn = Button(
@@ -195,7 +3512,7 @@ class NavBar(BoxLayout):
             self.add_widget(btn)
 
     def switch(self, btn):
-        self.sm.current = btn.screen_name
+        App.get_running_app().show_screen(btn.screen_name)
         for child in self.children:
             child.color = TEXT_SECONDARY
         btn.color = ACCENT
@@ -253,7 +3570,7 @@ class RegisterScreen(Screen):
         box.add_widget(reg_btn)
 
         login_btn = make_button("Jau ir konts? Ieiet", bg=CARD_COLOR, height=44)
-        login_btn.bind(on_press=lambda x: setattr(self.manager, "current", "login"))
+        login_btn.bind(on_press=lambda x: App.get_running_app().show_screen("login"))
         box.add_widget(login_btn)
 
         root.add_widget(scroll)
@@ -271,19 +3588,28 @@ class RegisterScreen(Screen):
         if password != confirm:
             show_popup("Kļūda", "Paroles nesakrīt!")
             return
-        if load_user_data(name):
+        app = App.get_running_app()
+
+        def create():   # поток ввода-вывода: главный поток не ждёт KDF и каталог
+            if app.store.exists(name):      # занятое имя — без лишнего KDF
+                return False
+            if not create_new_user(app.store, name, email, hash_password(password)):
+                return False
+            add_achievement(app.store, name, "Laipni lūgts!", "Reģistrējies aplikācijā", 50)
+            return True
+
+        app.store.run_async(create, lambda created: self._finish_register(name, created))
+
+    def _finish_register(self, name, created):
+        if not created:
             show_popup("Kļūda", "Šāds lietotājs jau eksistē!")
             return
 
-        data = create_new_user(name, email, password)
-        add_achievement(data, "Laipni lūgts!", "Reģistrējies aplikācijā", 50)
-        save_user_data(name, data)
-
-        App.get_running_app().current_user = name
+        app = App.get_running_app()
+        app.current_user = name
         show_popup("Veiksmīgi!", f"Sveiks, {name}!\nTu saņēmi 50 punktus par reģistrāciju! ")
         for inp in [self.name_input, self.email_input, self.password_input, self.confirm_input]:
             inp.text = ""
-        self.manager.current = "challenges"
         App.get_running_app().navbar.switch(App.get_running_app().navbar.children[-1])
 
 
@@ -326,7 +3652,7 @@ class LoginScreen(Screen):
         box.add_widget(login_btn)
 
         reg_btn = make_button("Nav konta? Reģistrēties", bg=CARD_COLOR, height=44)
-        reg_btn.bind(on_press=lambda x: setattr(self.manager, "current", "register"))
+        reg_btn.bind(on_press=lambda x: App.get_running_app().show_screen("register"))
         box.add_widget(reg_btn)
 
         root.add_widget(scroll)
@@ -340,15 +3666,22 @@ class LoginScreen(Screen):
             show_popup("Kļūda", "Aizpildiet visus laukus!")
             return
 
-        data = load_user_data(name)
-        if not data or data.get("password") != password:
+        app = App.get_running_app()
+        app.store.run_async(lambda: app.store.check_password(name, password),
+                            self._finish_login)
+
+    def _finish_login(self, name):
+        # name — как при регистрации, даже если ввели в другом регистре
+        if name is None:
             show_popup("Kļūda", "Nepareizs vārds vai parole!")
             return
 
-        App.get_running_app().current_user = name
+        app = App.get_running_app()
+        app.current_user = name
+        # Старые записи — в архив, в фоне: экраны читают архив при прокрутке
+        app.store.run_async(lambda: archive_old(app.store, name))
         self.name_input.text = ""
         self.password_input.text = ""
-        self.manager.current = "challenges"
         App.get_running_app().navbar.switch(App.get_running_app().navbar.children[-1])
 
 
@@ -378,79 +3711,53 @@ class ChallengesScreen(Screen):
         ))
         root.add_widget(header)
 
-        scroll, self.list_box = make_scrollable_box(spacing=10, padding=[15, 15])
-
         # Кнопка создания
         create_btn = make_button("+ Izveidot izaicinājumu", bg=ACCENT2,
                                  text_color=(0,0,0,1), height=52, font_size=16)
         create_btn.bind(on_press=self.open_create_popup)
-        self.list_box.add_widget(create_btn)
-
-        self.list_box.add_widget(make_label("Mani izaicinājumi:", bold=True,
-                                            color=TEXT_SECONDARY, height=28))
-        self.challenge_container = BoxLayout(
-            orientation="vertical", size_hint_y=None, spacing=8
-        )
-        self.challenge_container.bind(minimum_height=self.challenge_container.setter("height"))
-        self.list_box.add_widget(self.challenge_container)
+        root.add_widget(make_list_header(
+            create_btn,
+            make_label("Mani izaicinājumi:", bold=True, color=TEXT_SECONDARY, height=28)
+        ))
 
-        root.add_widget(scroll)
+        self.challenge_list = make_recycle_list(ChallengeCard)
+        self.challenges = RecordList(self.challenge_list, "izaicinajumi",
+                                     "Nav izaicinājumu. Izveidojiet savu pirmo!")
+        root.add_widget(self.challenge_list)
         self.add_widget(root)
 
+    @traced
     def on_enter(self):
         self.refresh_challenges()
 
+    @traced
     def refresh_challenges(self):
-        self.challenge_container.clear_widgets()
         app = App.get_running_app()
+        self.challenges.refresh(app.store, app.current_user)
         if not app.current_user:
             return
-        data = load_user_data(app.current_user)
-        if not data or not data.get("izaicinajumi"):
-            self.challenge_container.add_widget(
-                make_label("Nav izaicinājumu. Izveidojiet savu pirmo!",
-                           color=TEXT_SECONDARY, height=40, halign="center")
-            )
-            return
-
-        for ch in reversed(data["izaicinajumi"]):
-            card = self._make_challenge_card(ch)
-            self.challenge_container.add_widget(card)
+        username = app.current_user
 
-    def _make_challenge_card(self, ch):
-        card = BoxLayout(orientation="vertical", size_hint=(1, None),
-                         height=100, padding=[15, 10], spacing=4)
-        set_bg(card, CARD_COLOR)
+        def fetch():   # поток ввода-вывода
+            # результаты могли прийти синхронизацией — наградить и за них
+            award_challenges(app.store, username)
+            info = app.store.summary(username)
+            if not info:
+                return {}
+            challenges = info["stats"]["challenges"]
+            return {key: (done, key in challenges["completed"])
+                    for key, done in challenges["done"].items()}
 
-        top = BoxLayout(size_hint=(1, None), height=28)
-        top.add_widget(Label(
-            text=f"[b]{ch['title']}[/b]",
-            markup=True, font_size=16, color=ACCENT,
-            size_hint=(0.7, 1), halign="left"
-        ))
-        top.add_widget(Label(
-            text=ch["sport"],
-            font_size=13, color=ACCENT2,
-            size_hint=(0.3, 1), halign="right"
-        ))
-        card.add_widget(top)
+        app.store.run_async(fetch, self._show_progress)
 
-        desc = ch.get("description", "")
-        if desc:
-            card.add_widget(make_label(desc, font_size=13,
-                                       color=TEXT_SECONDARY, height=22))
-
-        bottom = Label(
-            text=f"Mērķis: {ch.get('target', '')} {ch.get('unit', '')}  |  Termiņš: {ch.get('deadline', 'Nav')}",
-            font_size=12, color=TEXT_SECONDARY,
-            size_hint=(1, None), height=22, halign="left"
-        )
-        bottom.bind(size=lambda w, v: setattr(w, "text_size", (v[0], None)))
-        card.add_widget(bottom)
-
-        return card
+    def _show_progress(self, progress):
+        if progress != getattr(self.challenge_list, "progress", None):
+            self.challenge_list.progress = progress
+            self.challenge_list.refresh_from_data()
 
     def open_create_popup(self, _):
+        from kivy.uix.popup import Popup
+        from kivy.uix.spinner import Spinner
         content = BoxLayout(orientation="vertical", spacing=10, padding=20)
 
         title_inp = make_input("Nosaukums, piem. 'Skrien 5km'")
@@ -493,30 +3800,36 @@ class ChallengesScreen(Screen):
         cancel_btn.bind(on_press=popup.dismiss)
 
         def save(_):
-            if not title_inp.text.strip():
-                show_popup("Kļūda", "Ievadiet nosaukumu!")
-                return
-            if sport_spinner.text == "Izvēlies sportu":
-                show_popup("Kļūda", "Izvēlieties sportu!")
-                return
-
-            app = App.get_running_app()
-            data = load_user_data(app.current_user)
-            data["izaicinajumi"].append({
+            challenge = {
                 "title":       title_inp.text.strip(),
-                "sport":       sport_spinner.text,
+                "sport":       "" if sport_spinner.text == "Izvēlies sportu" else sport_spinner.text,
                 "description": desc_inp.text.strip(),
                 "target":      target_inp.text.strip(),
                 "unit":        unit_inp.text.strip(),
                 "deadline":    deadline_inp.text.strip(),
                 "datums":      datetime.now().strftime("%d.%m.%Y")
-            })
-            add_achievement(data, "Izaicinājums izveidots!",
+            }
+            error = check_challenge(challenge)
+            if error:
+                show_popup("Kļūda", error)
+                return
+
+            app = App.get_running_app()
+            username = app.current_user
+            challenge = app.store.add(username, "challenge_created", challenge)
+            add_achievement(app.store, username, "Izaicinājums izveidots!",
                             f"Izveidots: {title_inp.text.strip()}", 20)
-            save_user_data(app.current_user, data)
             popup.dismiss()
-            self.refresh_challenges()
-            show_popup("Veiksmīgi!", "Izaicinājums izveidots! +20 punkti 🏆")
+            self.challenges.prepend(app.store, username, challenge)
+
+            def done(titles):
+                text = "Izaicinājums izveidots! +20 punkti 🏆"
+                for title in titles:
+                    text += f"\n{title}"
+                show_popup("Veiksmīgi!", text)
+
+            app.store.run_async(lambda: award_rules(app.store, username, [
+                ("challenge_created", None), ("achievement_awarded", None)]), done)
 
         save_btn.bind(on_press=save)
         btn_row.add_widget(cancel_btn)
@@ -548,77 +3861,37 @@ class ResultsScreen(Screen):
         ))
         root.add_widget(header)
 
-        scroll, self.list_box = make_scrollable_box(spacing=10, padding=[15, 15])
-
         # Кнопки
         btn_row = BoxLayout(size_hint=(1, None), height=52, spacing=10)
         add_btn  = make_button("+ Ievadīt rezultātu", bg=ACCENT, height=52)
-        sync_btn = make_button("⟳ Sinhronizēt", bg=CARD_COLOR, height=52)
+        self.sync_btn = sync_btn = make_button("⟳ Sinhronizēt", bg=CARD_COLOR, height=52)
         add_btn.bind(on_press=self.open_add_popup)
         sync_btn.bind(on_press=self.sync)
         btn_row.add_widget(add_btn)
         btn_row.add_widget(sync_btn)
-        self.list_box.add_widget(btn_row)
-
-        self.list_box.add_widget(make_label("Rezultātu vēsture:", bold=True,
-                                            color=TEXT_SECONDARY, height=28))
-        self.results_container = BoxLayout(
-            orientation="vertical", size_hint_y=None, spacing=8
-        )
-        self.results_container.bind(minimum_height=self.results_container.setter("height"))
-        self.list_box.add_widget(self.results_container)
+        root.add_widget(make_list_header(
+            btn_row,
+            make_label("Rezultātu vēsture:", bold=True, color=TEXT_SECONDARY, height=28)
+        ))
 
-        root.add_widget(scroll)
+        self.results_list = make_recycle_list(ResultCard)
+        self.results = RecordList(self.results_list, "rezultati",
+                                  "Nav rezultātu. Pievienojiet pirmo!")
+        root.add_widget(self.results_list)
         self.add_widget(root)
 
+    @traced
     def on_enter(self):
         self.refresh_results()
 
+    @traced
     def refresh_results(self):
-        self.results_container.clear_widgets()
         app = App.get_running_app()
-        if not app.current_user:
-            return
-        data = load_user_data(app.current_user)
-        if not data or not data.get("rezultati"):
-            self.results_container.add_widget(
-                make_label("Nav rezultātu. Pievienojiet pirmo!",
-                           color=TEXT_SECONDARY, height=40, halign="center")
-            )
-            return
-
-        for r in reversed(data["rezultati"]):
-            card = self._make_result_card(r)
-            self.results_container.add_widget(card)
-
-    def _make_result_card(self, r):
-        card = BoxLayout(orientation="horizontal", size_hint=(1, None),
-                         height=72, padding=[15, 8], spacing=10)
-        set_bg(card, CARD_COLOR)
-
-        left = BoxLayout(orientation="vertical", size_hint=(0.75, 1))
-        left.add_widget(Label(
-            text=f"[b]{r['sport']}[/b]",
-            markup=True, font_size=15, color=TEXT_PRIMARY,
-            size_hint=(1, None), height=24, halign="left"
-        ))
-        note = r.get("note", "")
-        left.add_widget(Label(
-            text=note if note else r.get("datums", ""),
-            font_size=12, color=TEXT_SECONDARY,
-            size_hint=(1, None), height=20, halign="left"
-        ))
-        card.add_widget(left)
-
-        right = Label(
-            text=f"[b]{r['value']} {r.get('unit','')}[/b]",
-            markup=True, font_size=18, color=ACCENT2,
-            size_hint=(0.25, 1), halign="right"
-        )
-        card.add_widget(right)
-        return card
+        self.results.refresh(app.store, app.current_user)
 
     def open_add_popup(self, _):
+        from kivy.uix.popup import Popup
+        from kivy.uix.spinner import Spinner
         content = BoxLayout(orientation="vertical", spacing=10, padding=20)
 
         sport_spinner = Spinner(
@@ -655,33 +3928,42 @@ class ResultsScreen(Screen):
         cancel_btn.bind(on_press=popup.dismiss)
 
         def save(_):
-            if sport_spinner.text == "Izvēlies sportu":
-                show_popup("Kļūda", "Izvēlieties sportu!")
-                return
-            if not value_inp.text.strip():
-                show_popup("Kļūda", "Ievadiet rezultātu!")
-                return
-            try:
-                float(value_inp.text.strip())
-            except ValueError:
-                show_popup("Kļūda", "Rezultātam jābūt skaitlim!")
-                return
-
-            app = App.get_running_app()
-            data = load_user_data(app.current_user)
-            data["rezultati"].append({
-                "sport":  sport_spinner.text,
+            result = {
+                "sport":  "" if sport_spinner.text == "Izvēlies sportu" else sport_spinner.text,
                 "value":  value_inp.text.strip(),
                 "unit":   unit_inp.text.strip(),
                 "note":   note_inp.text.strip(),
                 "datums": datetime.now().strftime("%d.%m.%Y %H:%M")
-            })
-            add_achievement(data, "Rezultāts reģistrēts!",
+            }
+            error = check_result(result)
+            if error:
+                show_popup("Kļūda", error)
+                return
+
+            app = App.get_running_app()
+            username = app.current_user
+            result = app.store.add(username, "result_added", result)
+            add_achievement(app.store, username, "Rezultāts reģistrēts!",
                             f"{sport_spinner.text}: {value_inp.text} {unit_inp.text}", 10)
-            save_user_data(app.current_user, data)
             popup.dismiss()
-            self.refresh_results()
-            show_popup("Veiksmīgi!", "Rezultāts saglabāts! +10 punkti")
+            self.results.prepend(app.store, username, result)
+
+            def award():   # поток ввода-вывода
+                # Прогресс вызовов и счётчики уже пересчитаны в stats при add
+                completed = award_challenges(app.store, username)
+                return completed, award_rules(app.store, username, [
+                    ("result_added", result.sport), ("achievement_awarded", None)])
+
+            def done(awarded):
+                completed, titles = awarded
+                text = "Rezultāts saglabāts! +10 punkti"
+                for title in completed:
+                    text += f"\nIzaicinājums izpildīts: {title} +{CHALLENGE_REWARD}"
+                for title in titles:
+                    text += f"\n{title}"
+                show_popup("Veiksmīgi!", text)
+
+            app.store.run_async(award, done)
 
         save_btn.bind(on_press=save)
         btn_row.add_widget(cancel_btn)
@@ -690,7 +3972,20 @@ class ResultsScreen(Screen):
         popup.open()
 
     def sync(self, _):
-        show_popup("Sinhronizācija", "Sinhronizācija ar ierīci\nNav pieejama šajā versijā.")
+        app = App.get_running_app()
+        if not app.current_user:
+            return
+        self.sync_btn.disabled = True
+        app.sync.run_async(app.current_user, self._sync_done)
+
+    def _sync_done(self, result):
+        self.sync_btn.disabled = False
+        if isinstance(result, SyncError):
+            show_popup("Sinhronizācija", str(result))
+            return
+        sent, received = result
+        show_popup("Sinhronizācija", f"Nosūtīti: {sent}\nSaņemti: {received}")
+        self.refresh_results()
 
 
 # ═══════════════════════════════════════════════════════════
@@ -715,8 +4010,6 @@ class PointsScreen(Screen):
         ))
         root.add_widget(header)
 
-        scroll, self.box = make_scrollable_box(spacing=10, padding=[15, 15])
-
         # Блок с общим количеством очков
         self.points_card = BoxLayout(size_hint=(1, None), height=110,
                                      padding=[20, 15], spacing=5,
@@ -732,82 +4025,59 @@ class PointsScreen(Screen):
             make_label("kopā punkti", font_size=14, color=TEXT_SECONDARY,
                        height=22, halign="center")
         )
-        self.box.add_widget(self.points_card)
 
         # Уровень
         self.level_label = make_label("", font_size=15, color=ACCENT2,
                                       height=30, halign="center")
-        self.box.add_widget(self.level_label)
-
-        self.box.add_widget(make_label("Sasniegumu vēsture:", bold=True,
-                                       color=TEXT_SECONDARY, height=28))
 
-        self.ach_container = BoxLayout(orientation="vertical",
-                                       size_hint_y=None, spacing=6)
-        self.ach_container.bind(minimum_height=self.ach_container.setter("height"))
-        self.box.add_widget(self.ach_container)
+        root.add_widget(make_list_header(
+            self.points_card,
+            self.level_label,
+            make_label("Sasniegumu vēsture:", bold=True, color=TEXT_SECONDARY, height=28)
+        ))
 
-        root.add_widget(scroll)
+        self.ach_list = make_recycle_list(AchievementCard, spacing=6)
+        self.achievements = RecordList(self.ach_list, "sasniegumi", "Nav sasniegumu vēl.")
+        root.add_widget(self.ach_list)
         self.add_widget(root)
 
+    @traced
     def on_enter(self):
         self.refresh()
 
+    @traced
     def refresh(self):
-        self.ach_container.clear_widgets()
         app = App.get_running_app()
+        self.achievements.refresh(app.store, app.current_user)
         if not app.current_user:
             return
-        data = load_user_data(app.current_user)
-        if not data:
-            return
+        username = app.current_user
 
-        total = data.get("punkti", 0)
-        self.points_label.text = str(total)
+        def fetch():   # поток ввода-вывода
+            # Догнать правила для записей, пришедших синхронизацией
+            titles = award_rules(app.store, username, [(kind, None) for kind in RULES])
+            return titles, app.store.summary(username)
 
-        # Уровень
-        level = "Iesācējs " if total < 100 else \
-                "Sportists " if total < 300 else \
-                "Meistars " if total < 600 else "Čempions "
-        self.level_label.text = f"Līmenis: {level}"
-
-        achievements = data.get("sasniegumi", [])
-        if not achievements:
-            self.ach_container.add_widget(
-                make_label("Nav sasniegumu vēl.", color=TEXT_SECONDARY,
-                           height=40, halign="center")
-            )
+        app.store.run_async(fetch, self._show_summary)
+
+    @traced
+    def _show_summary(self, result):
+        titles, info = result
+        if not info:
             return
+        if titles:
+            app = App.get_running_app()
+            self.achievements.refresh(app.store, app.current_user)
 
-        for ach in reversed(achievements):
-            card = BoxLayout(orientation="horizontal", size_hint=(1, None),
-                             height=70, padding=[15, 8], spacing=12)
-            set_bg(card, CARD_COLOR)
-
-            icon_label = Label(text="P", font_size=28,
-                               size_hint=(None, 1), width=40)
-            card.add_widget(icon_label)
-
-            info = BoxLayout(orientation="vertical", size_hint=(0.7, 1))
-            info.add_widget(Label(
-                text=f"[b]{ach['title']}[/b]",
-                markup=True, font_size=14, color=TEXT_PRIMARY,
-                size_hint=(1, None), height=24, halign="left"
-            ))
-            info.add_widget(Label(
-                text=ach.get("description", ""),
-                font_size=11, color=TEXT_SECONDARY,
-                size_hint=(1, None), height=18, halign="left"
-            ))
-            card.add_widget(info)
-
-            pts = Label(
-                text=f"[b]+{ach['punkti']}[/b]",
-                markup=True, font_size=16, color=ACCENT2,
-                size_hint=(0.22, 1), halign="right"
-            )
-            card.add_widget(pts)
-            self.ach_container.add_widget(card)
+        total = info.get("punkti", 0)
+        self.points_label.text = str(total)
+
+        level, next_level, threshold = level_for(total)
+        if next_level is None:
+            self.level_label.text = f"Līmenis: {level}"
+        else:
+            self.level_label.text = (f"Līmenis: {level}  "
+                                     f"(līdz {next_level}: {threshold - total} punkti)")
 
 
 # ═══════════════════════════════════════════════════════════
@@ -817,9 +4087,11 @@ class PointsScreen(Screen):
 class ProfileScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self._shown = None
         self.build_ui()
 
     def build_ui(self):
+        from kivy.uix.gridlayout import GridLayout
         self.clear_widgets()
         root = BoxLayout(orientation="vertical")
         set_bg(root, BG_COLOR)
@@ -854,7 +4126,7 @@ class ProfileScreen(Screen):
         self.box.add_widget(make_label("Statistika:", bold=True,
                                        color=TEXT_SECONDARY, height=28))
         self.stats_grid = GridLayout(cols=2, size_hint=(1, None),
-                                     height=160, spacing=8)
+                                     height=240, spacing=8)
         self.box.add_widget(self.stats_grid)
 
         # История
@@ -864,6 +4136,10 @@ class ProfileScreen(Screen):
                                            size_hint_y=None, spacing=6)
         self.history_container.bind(minimum_height=self.history_container.setter("height"))
         self.box.add_widget(self.history_container)
+        self.stat_cards = CardPool(StatCard)
+        self.history_rows = CardPool(HistoryRow)
+        self.history_empty = make_label("Nav rezultātu.", color=TEXT_SECONDARY,
+                                        height=30, halign="center")
 
         # Выход
         logout_btn = make_button("Iziet no konta", bg=DANGER, height=48)
@@ -873,98 +4149,295 @@ class ProfileScreen(Screen):
         root.add_widget(scroll)
         self.add_widget(root)
 
+    @traced
     def on_enter(self):
         self.refresh()
 
+    @traced
     def refresh(self):
         app = App.get_running_app()
         if not app.current_user:
             return
-        data = load_user_data(app.current_user)
-        if not data:
+        username = app.current_user
+
+        def fetch():   # поток ввода-вывода
+            info = app.store.summary(username)
+            if not info:
+                return None
+            return ((username, app.store.generation(username), info),
+                    app.store.rows(username, "rezultati", limit=5))
+
+        app.store.run_async(fetch, self._show)
+
+    @traced
+    def _show(self, result):
+        if result is None:
+            return
+        # Ничего не изменилось с прошлого показа — не перестраиваем
+        shown, results = result
+        if shown == self._shown:
             return
+        self._shown = shown
+        info = shown[2]
 
-        self.username_label.text = data.get("username", "—")
+        self.username_label.text = info.get("username", "—")
 
         # Статистика — карточки
-        self.stats_grid.clear_widgets()
         stats = [
-            ("🏆", "Izaicinājumi", str(len(data.get("izaicinajumi", [])))),
-            ("R", "Rezultāti",    str(len(data.get("rezultati", [])))),
-            ("P", "Punkti",       str(data.get("punkti", 0))),
-            ("🎖️", "Sasniegumi",   str(len(data.get("sasniegumi", [])))),
+            ("🏆", "Izaicinājumi", str(info.get("izaicinajumi", 0))),
+            ("R", "Rezultāti",    str(info.get("rezultati", 0))),
+            ("P", "Punkti",       str(info.get("punkti", 0))),
+            ("🎖️", "Sasniegumi",   str(info.get("sasniegumi", 0))),
+            ("🔥", "Sērija (dienas)", str(current_streak(info["stats"]["streak"]))),
+            ("⭐", "Labākā sērija",  str(info["stats"]["streak"]["best"])),
         ]
-        for icon, label, value in stats:
-            card = BoxLayout(orientation="vertical", size_hint=(1, None),
-                             height=72, padding=[10, 8])
-            set_bg(card, CARD_COLOR)
-            card.add_widget(Label(
-                text=f"[b]{value}[/b]",
-                markup=True, font_size=22, color=ACCENT,
-                size_hint=(1, None), height=30
-            ))
-            card.add_widget(Label(
-                text=f"{icon} {label}",
-                font_size=12, color=TEXT_SECONDARY,
-                size_hint=(1, None), height=20
-            ))
-            self.stats_grid.add_widget(card)
+        self.stat_cards.fill(self.stats_grid, stats)
 
         # История (последние 5)
-        self.history_container.clear_widgets()
-        results = data.get("rezultati", [])
+        self.history_rows.fill(self.history_container, results)
         if not results:
-            self.history_container.add_widget(
-                make_label("Nav rezultātu.", color=TEXT_SECONDARY,
-                           height=30, halign="center")
-            )
-        else:
-            for r in reversed(results[-5:]):
-                row = BoxLayout(size_hint=(1, None), height=40, padding=[12, 5])
-                set_bg(row, CARD_COLOR)
-                row.add_widget(Label(
-                    text=r["sport"], font_size=14, color=TEXT_PRIMARY,
-                    size_hint=(0.5, 1), halign="left"
-                ))
-                row.add_widget(Label(
-                    text=f"{r['value']} {r.get('unit','')}",
-                    font_size=14, color=ACCENT2,
-                    size_hint=(0.3, 1), halign="right"
-                ))
-                row.add_widget(Label(
-                    text=r.get("datums", "")[:10],
-                    font_size=11, color=TEXT_SECONDARY,
-                    size_hint=(0.2, 1), halign="right"
-                ))
-                self.history_container.add_widget(row)
+            self.history_container.add_widget(self.history_empty)
 
     def logout(self, _):
-        App.get_running_app().current_user = None
-        self.manager.current = "login"
+        app = App.get_running_app()
+        app.store.flush()
+        app.current_user = None
+        app.show_screen("login")
+
+
+# ═══════════════════════════════════════════════════════════
+#  7. LĪDERI — рейтинг всех пользователей по очкам
+# ═══════════════════════════════════════════════════════════
+
+LEADERBOARD_TOP = 100   # сколько строк рейтинга показывать
+
+
+class LeaderboardScreen(Screen):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.build_ui()
+
+    def build_ui(self):
+        self.clear_widgets()
+        root = BoxLayout(orientation="vertical")
+        set_bg(root, BG_COLOR)
+
+        header = BoxLayout(size_hint=(1, None), height=65, padding=[20, 10])
+        set_bg(header, (0.05, 0.05, 0.12, 1))
+        header.add_widget(Label(
+            text="[b] Līderu tabula[/b]",
+            markup=True, font_size=20, color=ACCENT
+        ))
+        root.add_widget(header)
+
+        self.rank_label = make_label("", font_size=15, color=ACCENT2,
+                                     height=30, halign="center")
+        root.add_widget(make_list_header(
+            self.rank_label,
+            make_label(f"Top {LEADERBOARD_TOP}:", bold=True,
+                       color=TEXT_SECONDARY, height=28)
+        ))
+
+        self.board_list = make_recycle_list(LeaderRow, spacing=4)
+        root.add_widget(self.board_list)
+        self.add_widget(root)
+
+    @traced
+    def on_enter(self):
+        self.refresh()
+
+    @traced
+    def refresh(self):
+        app = App.get_running_app()
+        username = app.current_user
+        if not self.board_list.data:
+            show_loading(self.board_list)
+
+        def fetch():   # поток ввода-вывода
+            board = app.store.leaderboard()
+            return (username, board.top(LEADERBOARD_TOP), board.rank(username),
+                    board.points(username), len(board))
+
+        app.store.run_async(fetch, self._show)
+
+    @traced
+    def _show(self, result):
+        username, top, place, punkti, total = result
+        if place is None:
+            self.rank_label.text = f"Lietotāji: {total}"
+        else:
+            self.rank_label.text = f"Tava vieta: {place}. no {total}  ({punkti} punkti)"
+        if not top:
+            show_records(self.board_list, [], "Vēl nav neviena lietotāja.")
+            return
+        self.board_list.data = [
+            {"place": place, "username": name, "punkti": pts, "me": name == username}
+            for place, name, pts in top
+        ]
+
+
+# ═══════════════════════════════════════════════════════════
+#  8. STATISTIKA — тенденции по видам спорта и прогресс вызовов
+# ═══════════════════════════════════════════════════════════
+
+class StatsScreen(Screen):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._shown = None
+        self.build_ui()
+
+    def build_ui(self):
+        self.clear_widgets()
+        root = BoxLayout(orientation="vertical")
+        set_bg(root, BG_COLOR)
+
+        header = BoxLayout(size_hint=(1, None), height=65, padding=[20, 10])
+        set_bg(header, (0.05, 0.05, 0.12, 1))
+        header.add_widget(Label(
+            text="[b] Statistika[/b]",
+            markup=True, font_size=20, color=ACCENT
+        ))
+        root.add_widget(header)
+
+        scroll, self.box = make_scrollable_box(spacing=10, padding=[15, 15])
+        self.summary_label = make_label("Ielādē...", font_size=14,
+                                        color=TEXT_SECONDARY, height=24)
+        self.box.add_widget(self.summary_label)
+
+        self.box.add_widget(make_label("Izaicinājumu progress:", bold=True,
+                                       color=TEXT_SECONDARY, height=28))
+        self.progress_container = BoxLayout(orientation="vertical",
+                                            size_hint_y=None, spacing=6)
+        self.progress_container.bind(minimum_height=self.progress_container.setter("height"))
+        self.box.add_widget(self.progress_container)
+
+        self.box.add_widget(make_label("Pa sporta veidiem:", bold=True,
+                                       color=TEXT_SECONDARY, height=28))
+        self.sport_container = BoxLayout(orientation="vertical",
+                                         size_hint_y=None, spacing=8)
+        self.sport_container.bind(minimum_height=self.sport_container.setter("height"))
+        self.box.add_widget(self.sport_container)
+
+        self.sport_cards = CardPool(SportStatsCard)
+        self.progress_rows = CardPool(ProgressRow)
+        self.progress_empty = make_label("Nav izaicinājumu ar mērķi.",
+                                         color=TEXT_SECONDARY, height=30)
+
+        root.add_widget(scroll)
+        self.add_widget(root)
+
+    @traced
+    def on_enter(self):
+        self.refresh()
+
+    @traced
+    def refresh(self):
+        app = App.get_running_app()
+        if not app.current_user:
+            return
+        username = app.current_user
+        app.store.run_async(lambda: app.analytics.stats(username), self._show)
+
+    @traced
+    def _show(self, stats):
+        # Analytics отдаёт тот же объект, пока данные не менялись
+        if stats is self._shown:
+            return
+        self._shown = stats
+        self.summary_label.text = (f"Rezultāti: {stats['count']}  |  "
+                                   f"Sporta veidi: {len(stats['sports'])}")
+        self.progress_rows.fill(self.progress_container, stats["challenges"])
+        if not stats["challenges"]:
+            self.progress_container.add_widget(self.progress_empty)
+        self.sport_cards.fill(self.sport_container, stats["sports"])
+
+
+# ═══════════════════════════════════════════════════════════
+#  ATKĻŪDOŠANA — оверлей с замерами (SPORTA_PROFILE=1, F12)
+# ═══════════════════════════════════════════════════════════
+
+class DebugOverlay(BoxLayout):
+    def __init__(self, **kwargs):
+        super().__init__(orientation="vertical", size_hint=(None, None),
+                         size=(340, 300), padding=8, spacing=4, **kwargs)
+        set_bg(self, (0, 0, 0, 0.75))
+        self.info = Label(font_size=12, color=TEXT_PRIMARY, halign="left",
+                          valign="top", font_name="RobotoMono-Regular")
+        self.info.bind(size=lambda w, v: setattr(w, "text_size", v))
+        self.add_widget(self.info)
+        export_btn = make_button("Eksportēt trasi", bg=CARD_COLOR, font_size=13, height=34)
+        export_btn.bind(on_press=self.export)
+        self.add_widget(export_btn)
+        self._event = None
+
+    def show(self, window):
+        self.pos = (0, window.height - self.height)
+        window.add_widget(self)
+        self.update()
+        self._event = Clock.schedule_interval(self.update, 0.5)
+
+    def hide(self, window):
+        self._event.cancel()
+        window.remove_widget(self)
+
+    def update(self, *_):
+        frames = TRACE.frames
+        lines = []
+        if frames:
+            avg = sum(frames) / len(frames)
+            lines.append(f"kadrs: {avg * 1000:.1f} ms vid., {max(frames) * 1000:.1f} ms maks.,"
+                         f" {1 / avg if avg else 0:.0f} fps")
+        lines.append(f"logrīki: {TRACE.widgets}, notikumi: {len(TRACE.events)}")
+        for name, ms, widgets in reversed(TRACE.recent):
+            lines.append(f"{ms:7.1f} ms  +{widgets:<3} {name.replace('.<locals>', '')}")
+        self.info.text = "\n".join(lines)
+
+    def export(self, _):
+        self.info.text = f"-> {TRACE.export()}"
 
 
 # ═══════════════════════════════════════════════════════════
 #  GALVENĀ APLIKĀCIJA
 # ═══════════════════════════════════════════════════════════
 
+# Экраны создаются при первом переходе на них, а не все сразу в build
+SCREENS = {
+    "register":   RegisterScreen,
+    "login":      LoginScreen,
+    "challenges": ChallengesScreen,
+    "results":    ResultsScreen,
+    "points":     PointsScreen,
+    "profile":    ProfileScreen,
+    "leaderboard": LeaderboardScreen,
+    "stats":      StatsScreen,
+}
+
+
 class SportaAplikacija(App):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.current_user = None
-
+        self.store = UserStore()
+        self.sync = SyncClient(self.store)
+        self.analytics = Analytics(self.store)
+        self.startup_times = {}
+        if TRACE.enabled:
+            TRACE.install()
+
+    @traced
     def build(self):
+        t_build = time.perf_counter()
         self.title = "Sporta Aplikācija"
         ensure_dir()
+        recover_data_dir()
 
         # ScreenManager
-        sm = ScreenManager()
-        sm.add_widget(RegisterScreen(name="register"))
-        sm.add_widget(LoginScreen(name="login"))
-        sm.add_widget(ChallengesScreen(name="challenges"))
-        sm.add_widget(ResultsScreen(name="results"))
-        sm.add_widget(PointsScreen(name="points"))
-        sm.add_widget(ProfileScreen(name="profile"))
-        sm.current = "register"
+        self.sm = sm = ScreenManager()
+        # SPORTA_EAGER_SCREENS=1 — старое поведение, для сравнения времени старта
+        if os.environ.get("SPORTA_EAGER_SCREENS"):
+            for name in SCREENS:
+                self.get_screen(name)
+        self.show_screen("register")
 
         # Навигационная панель
         self.navbar = NavBar(sm)
@@ -974,8 +4447,51 @@ class SportaAplikacija(App):
         root.add_widget(sm)
         root.add_widget(self.navbar)
 
+        self.startup_times["import"] = t_build - STARTUP_T0
+        self.startup_times["build"] = time.perf_counter() - t_build
         return root
 
+    def get_screen(self, name):
+        if not self.sm.has_screen(name):
+            self.sm.add_widget(SCREENS[name](name=name))
+        return self.sm.get_screen(name)
+
+    def show_screen(self, name):
+        self.get_screen(name)
+        self.sm.current = name
+
+    def on_start(self):
+        from kivy.core.window import Window
+        Window.bind(on_flip=self._on_first_frame)
+        if TRACE.enabled:
+            self.debug_overlay = DebugOverlay()
+            self.debug_overlay.show(Window)
+            Window.bind(on_keyboard=self._on_key)
+
+    def _on_key(self, window, key, *_):
+        if key == 293:   # F12 — показать/спрятать оверлей
+            if self.debug_overlay.parent:
+                self.debug_overlay.hide(window)
+            else:
+                self.debug_overlay.show(window)
+            return True
+
+    def _on_first_frame(self, window):
+        window.unbind(on_flip=self._on_first_frame)
+        t = self.startup_times
+        t["first_frame"] = time.perf_counter() - STARTUP_T0
+        Logger.info(
+            "Startup: imports %.0f ms, build %.0f ms, first frame %.0f ms (%s screens)",
+            t["import"] * 1000, t["build"] * 1000, t["first_frame"] * 1000,
+            "eager" if os.environ.get("SPORTA_EAGER_SCREENS") else "lazy")
+
+    def on_pause(self):
+        self.store.flush(wait=True)
+        return True
+
+    def on_stop(self):
+        self.store.flush(wait=True)
+
 
 if __name__ == "__main__":
     SportaAplikacija().run()
\ No newline at end of file
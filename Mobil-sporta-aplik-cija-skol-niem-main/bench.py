@@ -0,0 +1,194 @@
+import gc
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+# Без окна: экраны строятся и обновляются, но Window не создаётся
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+import kivy
+from kivy.logger import Logger, LOG_LEVELS
+Logger.setLevel(LOG_LEVELS["warning"])
+from kivy.config import Config
+# Clock.tick() не должен ждать следующего кадра — меряем работу, а не 60 fps
+Config.set("graphics", "maxfps", "0")
+from kivy.app import App
+from kivy.clock import Clock
+
+import app
+from bench_json import make_profile, best_of
+
+
+# ═══════════════════════════════════════════════════════════
+#  MĒRĪJUMI — хранилище и экраны на профилях разного размера
+# ═══════════════════════════════════════════════════════════
+# python bench.py [out.json] [размер ...]
+# Каждая строка результата: size, backend, case и ms (лучшее из repeat)
+# или value — для замеров памяти, где единица указана в case.
+# JSON с результатами можно сравнивать между версиями.
+
+BACKENDS = ("json", "eventlog", "segment", "sqlite")
+REFRESH_SCREENS = ("challenges", "results", "points", "profile", "leaderboard", "stats")
+APPENDS = 100
+TAB_SWITCHES = 100
+
+
+def write_profile(backend, data):
+    # Профиль целиком одним событием, как после регистрации;
+    # для журнала событий — сразу в снимок
+    backend.write(data["username"], data, [{"type": "user_created", "data": data}])
+    if isinstance(backend, app.EventLogBackend):
+        backend.compact(data["username"], data)
+
+
+def wait_idle(store, rounds=5):
+    # Дождаться потока ввода-вывода и выполнить колбэки Clock
+    for _ in range(rounds):
+        store._io.submit(lambda: None).result()
+        Clock.tick()
+
+
+def bench_files(data, repeat):
+    # load_user_data / save_user_data — формат одного JSON-файла
+    username = data["username"]
+    app.save_user_data(username, data)
+    loaded = app.load_user_data(username)
+    yield "save_user_data", best_of(lambda: app.save_user_data(username, loaded), repeat)
+    yield "load_user_data", best_of(lambda: app.load_user_data(username), repeat)
+
+
+def bench_backend(kind, data, repeat):
+    username = data["username"]
+    app.STORAGE_BACKEND = kind
+    write_profile(app.BACKENDS[kind](), data)
+
+    def cold_get():
+        store = app.UserStore()
+        store.get(username)
+        store._io.shutdown()
+
+    yield "store.get cold", best_of(cold_get, repeat)
+
+    store = app.UserStore()
+    store.get(username)
+    store.run_async(store.leaderboard).result()   # разовая сборка индекса — не в счёт
+    t = time.perf_counter()
+    for i in range(APPENDS):
+        app.add_achievement(store, username, "Bench", f"#{i}", 1)
+    added = time.perf_counter() - t
+    store.flush(wait=True)
+    yield "add_achievement", added / APPENDS
+    yield "add_achievement+flush", (time.perf_counter() - t) / APPENDS
+
+
+def bench_screens(bench_app, username, repeat):
+    for name in REFRESH_SCREENS:
+        cls = app.SCREENS[name]
+        yield f"build {name}", best_of(lambda: cls(name=name), repeat)
+
+        def refresh():
+            # Новый экран каждый раз — иначе второй проход ничего не перерисует
+            screen = cls(name=name)
+            t = time.perf_counter()
+            screen.on_enter()
+            wait_idle(bench_app.store)
+            return time.perf_counter() - t
+
+        yield f"refresh {name}", min(refresh() for _ in range(repeat))
+
+
+def alive_widgets():
+    from kivy.uix.widget import Widget
+    gc.collect()
+    # issubclass(type()) — слабые прокси при isinstance разыменовываются
+    return sum(1 for o in gc.get_objects() if issubclass(type(o), Widget))
+
+
+def bench_tabs(bench_app, username):
+    # TAB_SWITCHES раз по всем вкладкам, с новым результатом перед каждым
+    # кругом — чтобы экраны действительно перерисовывались. Память —
+    # по tracemalloc, виджеты — сколько осталось живых после сборки мусора.
+    screens = [bench_app.get_screen(name) for name in REFRESH_SCREENS]
+    for screen in screens:
+        screen.on_enter()
+    wait_idle(bench_app.store)
+    widgets = alive_widgets()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    t = time.perf_counter()
+    for i in range(TAB_SWITCHES):
+        bench_app.store.add(username, "result_added", {
+            "sport": "Cits", "value": str(i), "unit": "", "note": "", "datums": ""})
+        for screen in screens:
+            screen.on_enter()
+            wait_idle(bench_app.store, rounds=2)
+    elapsed = time.perf_counter() - t
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    grown = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    yield f"tabs x{TAB_SWITCHES} ms/round", elapsed * 1000 / TAB_SWITCHES
+    yield f"tabs x{TAB_SWITCHES} KiB kept", grown / 1024
+    yield f"tabs x{TAB_SWITCHES} KiB peak", peak / 1024
+    yield f"tabs x{TAB_SWITCHES} widgets kept", alive_widgets() - widgets
+
+
+def bench(sizes=(100, 1000, 10000), repeat=3):
+    rows = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            bench_app = app.SportaAplikacija()
+            App._running_app = bench_app
+            bench_app.build()
+            for n in sizes:
+                data = make_profile(n)
+                for case, s in bench_files(data, repeat):
+                    rows.append({"size": n, "backend": "json", "case": case, "ms": s * 1000})
+                for kind in BACKENDS:
+                    for case, s in bench_backend(kind, make_profile(n), repeat):
+                        rows.append({"size": n, "backend": kind, "case": case, "ms": s * 1000})
+                    bench_app.store = app.UserStore()
+                    bench_app.analytics = app.Analytics(bench_app.store)
+                    bench_app.current_user = data["username"]
+                    for case, s in bench_screens(bench_app, data["username"], repeat):
+                        rows.append({"size": n, "backend": kind, "case": case, "ms": s * 1000})
+                    for case, value in bench_tabs(bench_app, data["username"]):
+                        rows.append({"size": n, "backend": kind, "case": case, "value": value})
+                    bench_app.store.flush(wait=True)
+                    for name in os.listdir(app.DATA_DIR):
+                        if name != "users.db":
+                            os.remove(os.path.join(app.DATA_DIR, name))
+        finally:
+            os.chdir(cwd)
+    return rows
+
+
+def environment():
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "kivy": kivy.__version__,
+        "orjson": app.orjson is not None,
+        "machine": platform.machine(),
+    }
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    out = args.pop(0) if args and args[0].endswith(".json") else "bench_results.json"
+    sizes = [int(a) for a in args] or (100, 1000, 10000)
+    rows = bench(sizes)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"env": environment(), "results": rows}, f, ensure_ascii=False, indent=2)
+    print(f"{'ieraksti':>9}  {'glabātuve':<9} {'mērījums':<28} {'ms':>9}")
+    for r in rows:
+        print(f"{r['size']:>9}  {r['backend']:<9} {r['case']:<28} {r.get('ms', r.get('value')):>9.2f}")
+    print(f"-> {out}")
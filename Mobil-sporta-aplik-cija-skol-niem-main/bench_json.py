@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+import app
+
+
+# ═══════════════════════════════════════════════════════════
+#  SINTĒTISKI PROFILI — тестовые данные нужного размера
+# ═══════════════════════════════════════════════════════════
+
+def make_profile(n_records, seed=1):
+    # n_records записей, поделённых между результатами и достижениями,
+    # плюс несколько десятков вызовов — как у активного пользователя
+    rnd = random.Random(seed)
+    data = {
+        "username": f"bench{n_records}",
+        "email": "bench@example.com",
+        "password": "parole",
+        "punkti": 0,
+        "izaicinajumi": [],
+        "rezultati": [],
+        "sasniegumi": [],
+    }
+    for i in range(max(1, n_records // 50)):
+        data["izaicinajumi"].append({
+            "title": f"Izaicinājums {i}", "sport": rnd.choice(app.SPORTS),
+            "description": "", "target": str(rnd.randint(1, 100)), "unit": "km",
+            "deadline": "31.12.2026", "datums": "01.01.2026",
+        })
+    for i in range(n_records // 2):
+        day = 1 + i % 28
+        data["rezultati"].append({
+            "sport": rnd.choice(app.SPORTS), "value": f"{rnd.uniform(0, 50):.1f}",
+            "unit": "km", "note": "Rīta treniņš" if i % 3 == 0 else "",
+            "datums": f"{day:02d}.02.2026 {i % 24:02d}:{i % 60:02d}",
+        })
+    for i in range(n_records - n_records // 2):
+        data["sasniegumi"].append({
+            "title": "Rezultāts reģistrēts!", "description": "Skriešana: 5 km",
+            "punkti": 10, "datums": "18.02.2026 15:31",
+        })
+        data["punkti"] += 10
+    return data
+
+
+# ═══════════════════════════════════════════════════════════
+#  SERIALIZĀCIJA — stdlib json pret orjson
+# ═══════════════════════════════════════════════════════════
+
+def serializers():
+    yield "json indent=2", (
+        lambda d: json.dumps(d, ensure_ascii=False, indent=2).encode("utf-8"),
+        json.loads)
+    yield "json compact", (
+        lambda d: json.dumps(d, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        json.loads)
+    if app.orjson is not None:
+        yield "orjson indent=2", (
+            lambda d: app.orjson.dumps(d, option=app.orjson.OPT_INDENT_2),
+            app.orjson.loads)
+        yield "orjson compact", (app.orjson.dumps, app.orjson.loads)
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def bench(sizes=(1000, 10000, 100000), repeat=3):
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            data = make_profile(n)
+            for name, (dumps, loads) in serializers():
+                path = os.path.join(tmp, "profile.json")
+                raw = dumps(data)
+
+                def dump():
+                    with open(path, "wb") as f:
+                        f.write(dumps(data))
+
+                def load():
+                    with open(path, "rb") as f:
+                        loads(f.read())
+
+                dump_s = best_of(dump, repeat)
+                load_s = best_of(load, repeat)
+                rows.append((n, name, dump_s * 1000, load_s * 1000, len(raw) / 1024))
+    return rows
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or (1000, 10000, 100000)
+    print(f"{'ieraksti':>9}  {'formāts':<16} {'dump ms':>9} {'load ms':>9} {'KiB':>9}")
+    for n, name, dump_ms, load_ms, kib in bench(sizes):
+        print(f"{n:>9}  {name:<16} {dump_ms:>9.1f} {load_ms:>9.1f} {kib:>9.0f}")
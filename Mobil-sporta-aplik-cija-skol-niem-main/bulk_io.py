@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+
+# Kivy не должна разбирать аргументы командной строки
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+import app
+
+
+# ═══════════════════════════════════════════════════════════
+#  IMPORTS UN EKSPORTS — rezultati / izaicinajumi no CSV un JSONL
+# ═══════════════════════════════════════════════════════════
+# python bulk_io.py import <lietotājs> rezultati dati.csv
+# python bulk_io.py export <lietotājs> izaicinajumi izaicinajumi.jsonl
+# Формат — по расширению файла: .jsonl или CSV с заголовком.
+
+def main(args):
+    if len(args) != 4 or args[0] not in ("import", "export") or args[2] not in app.IMPORT_EVENTS:
+        print("bulk_io.py import|export <lietotājs> rezultati|izaicinajumi <fails>")
+        return 2
+    command, username, key, path = args
+    store = app.UserStore()
+    # имя как при регистрации: "andrejs" найдёт профиль "Andrejs"
+    entry = store.run_async(lambda: store.directory().find(username)).result()
+    name = entry["username"] if entry else username
+    if store.get(name) is None:
+        print(f"Lietotājs {username} nav atrasts")
+        return 1
+    t = time.perf_counter()
+    if command == "import":
+        report = app.import_records(store, name, key, path)
+        for line, error in report["errors"]:
+            print(f"  {line}. rinda: {error}")
+        print(f"Importēti: {report['imported']}, izlaisti: {report['skipped']}")
+    else:
+        print(f"Eksportēti: {app.export_records(store, name, key, path)} -> {path}")
+    store.flush(wait=True)
+    print(f"{time.perf_counter() - t:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
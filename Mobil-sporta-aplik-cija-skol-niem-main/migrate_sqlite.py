@@ -0,0 +1,38 @@
+import os
+import sys
+
+# Kivy не должна разбирать аргументы командной строки
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+import app
+
+
+# ═══════════════════════════════════════════════════════════
+#  MIGRĀCIJA — перенос профилей из user_data в SQLite
+# ═══════════════════════════════════════════════════════════
+
+def migrate(db_path=None):
+    # Снимок <name>.json плюс журнал событий и сегмент результатов, если
+    # они есть; профили без сегмента он читает как EventLogBackend.
+    # Источник только читается: SegmentBackend.read не переносит старый
+    # формат и не отрезает следы сбоя, как это делает load
+    source = app.SegmentBackend()
+    target = app.SqliteBackend(db_path)
+    imported, skipped = 0, 0
+    for username in app.list_usernames():
+        data = source.read(username)
+        if not data:
+            continue
+        data.setdefault("username", username)
+        if target.import_user(data):
+            imported += 1
+            print(f"  + {username}")
+        else:
+            skipped += 1
+            print(f"  = {username} (jau ir datubāzē)")
+    print(f"Importēti: {imported}, izlaisti: {skipped} -> {target.path}")
+    print("Lai lietotu datubāzi: SPORTA_STORAGE=sqlite python app.py")
+
+
+if __name__ == "__main__":
+    migrate(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,115 @@
+import os
+import sys
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Kivy не должна разбирать аргументы командной строки
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+import app
+
+
+# ═══════════════════════════════════════════════════════════
+#  SINHRONIZĀCIJAS SERVERIS — локальная замена сервера для проверки
+# ═══════════════════════════════════════════════════════════
+# Тот же протокол, что ждёт app.SyncClient. Записи держатся в памяти
+# (и в файле, если он указан). Запуск:
+#   python sync_server.py 8765 sync_data.json
+#   SPORTA_SYNC_URL=http://127.0.0.1:8765 python app.py
+
+class SyncStore:
+    def __init__(self, path=None):
+        self.path = path
+        self.seq = 0
+        self.users = {}      # username -> {id: запись}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                saved = app.load_json(f.read())
+            self.seq, self.users = saved["seq"], saved["users"]
+
+    def save(self):
+        if self.path:
+            app.write_atomic(self.path, app.dump_json({"seq": self.seq, "users": self.users}))
+
+    def merge(self, username, device, records):
+        # Тот же id — оставляем запись с более поздним datums; устройство,
+        # приславшее запись, получать её обратно не должно
+        known = self.users.setdefault(username, {})
+        for item in records:
+            old = known.get(item["id"])
+            if old is not None and (app.datums_sort_key(item["data"].get("datums"))
+                                    <= app.datums_sort_key(old["data"].get("datums"))):
+                if device not in old["devices"]:
+                    old["devices"].append(device)
+                continue
+            self.seq += 1
+            known[item["id"]] = dict(item, devices=[device], seq=self.seq)
+
+    def since(self, username, device, since, limit):
+        # Записи других устройств после since, не больше limit за раз
+        items = sorted((r for r in self.users.get(username, {}).values()
+                        if r["seq"] > since), key=lambda r: r["seq"])
+        out = []
+        for r in items:
+            if len(out) == limit:
+                return out, since, True
+            since = r["seq"]
+            if device not in r["devices"]:
+                out.append({"key": r["key"], "id": r["id"], "data": r["data"]})
+        return out, self.seq, False
+
+    def handle(self, username, body):
+        with self.lock:
+            self.merge(username, body["device"], body.get("records", []))
+            self.save()
+            if not body.get("pull", True):
+                return {"records": [], "since": body.get("since", 0), "more": False}
+            records, since, more = self.since(username, body["device"],
+                                              body.get("since", 0), app.SYNC_BATCH)
+        return {"records": records, "since": since, "more": more}
+
+
+class SyncHandler(BaseHTTPRequestHandler):
+    store = None
+
+    def do_POST(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "sync":
+            self.send_error(404)
+            return
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            raw = gzip.decompress(raw)
+        try:
+            body = app.load_json(raw)
+        except ValueError:
+            self.send_error(400)
+            return
+        username = app.urllib.parse.unquote(parts[1])
+        reply = app.dump_json(self.store.handle(username, body))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            reply = gzip.compress(reply)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, fmt, *args):
+        print(f"  {self.address_string()} {fmt % args}")
+
+
+def make_server(port=0, path=None):
+    # port=0 — свободный порт; адрес: server.server_address
+    handler = type("Handler", (SyncHandler,), {"store": SyncStore(path)})
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server = make_server(port, sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"Sinhronizācijas serveris: http://127.0.0.1:{server.server_address[1]}")
+    server.serve_forever()
@@ -0,0 +1,23 @@
+import os
+import sys
+
+# Kivy не должна разбирать аргументы pytest и писать лог в консоль
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # Каждый тест — со своим пустым user_data
+    path = tmp_path / "user_data"
+    monkeypatch.setattr(app, "DATA_DIR", str(path))
+    return path
+
+
+def result(value, sport="Skriešana", datums="01.03.2026 10:00"):
+    return {"sport": sport, "value": str(value), "unit": "km", "note": "", "datums": datums}
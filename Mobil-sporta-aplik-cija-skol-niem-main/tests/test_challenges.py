@@ -0,0 +1,45 @@
+from datetime import datetime
+
+import app
+from conftest import result
+
+
+def test_stats_tab_shows_engine_progress(data_dir):
+    store = app.UserStore()
+    app.create_new_user(store, "Anna", "anna@example.com", "x")
+    now = datetime.now().strftime(app.DATETIME_FMT)
+    # результат до создания вызова в зачёт не идёт — ни на одной вкладке
+    store.add("Anna", "result_added", result(3, datums=now))
+    store.add("Anna", "challenge_created", {
+        "title": "10 km", "sport": "Skriešana", "description": "", "target": "10",
+        "unit": "km", "deadline": "", "datums": now})
+    store.add("Anna", "result_added", result(2, datums=now))
+    store.flush(wait=True)
+
+    engine = store.summary("Anna")["stats"]["challenges"]["done"]
+    shown = app.Analytics(store).stats("Anna")["challenges"]
+    assert list(engine.values()) == [2.0]
+    assert [c["done"] for c in shown] == [2.0]
+
+
+def test_completed_challenge_is_awarded_once(data_dir):
+    store = app.UserStore()
+    app.create_new_user(store, "Anna", "anna@example.com", "x")
+    now = datetime.now().strftime(app.DATETIME_FMT)
+    store.add("Anna", "challenge_created", {
+        "title": "5 km", "sport": "Skriešana", "description": "", "target": "5",
+        "unit": "km", "deadline": "", "datums": now})
+    store.add("Anna", "result_added", result(6, datums=now))
+    store.flush(wait=True)
+    assert app.award_challenges(store, "Anna") == ["5 km"]
+    store.flush(wait=True)
+    assert app.award_challenges(store, "Anna") == []
+    awarded = store.summary("Anna")["stats"]["challenges"]["awarded"]
+    assert list(awarded.values()) == [True]
+
+
+def test_awarded_list_from_old_profiles_is_upgraded():
+    stats = app.new_stats()
+    stats["challenges"]["awarded"] = ["a", "b"]
+    data = app.ensure_stats({"stats": stats})
+    assert data["stats"]["challenges"]["awarded"] == {"a": True, "b": True}
@@ -0,0 +1,82 @@
+import pytest
+
+import app
+from conftest import result
+
+BACKENDS = ["json", "eventlog", "segment", "sqlite"]
+
+
+def new_session(name):
+    # Новый запуск: индекс очков ещё не открыт, профиль не в памяти
+    return app.UserStore(backend=app.BACKENDS[name]())
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_first_award_of_a_session_is_counted_once(data_dir, name):
+    store = new_session(name)
+    app.create_new_user(store, "Anna", "anna@example.com", "x")
+    store.flush(wait=True)
+
+    store = new_session(name)
+    app.add_achievement(store, "Anna", "Pirmais", "", 10)
+    store.flush(wait=True)
+
+    assert store.summary("Anna")["punkti"] == 10
+    assert store.leaderboard().points("Anna") == 10
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_awards_after_loading_the_profile_match_the_index(data_dir, name):
+    store = new_session(name)
+    app.create_new_user(store, "Anna", "anna@example.com", "x")
+    store.flush(wait=True)
+
+    store = new_session(name)
+    store.get("Anna")          # как bulk_io перед импортом
+    for _ in range(3):
+        app.add_achievement(store, "Anna", "Imports", "", 10)
+    store.flush(wait=True)
+
+    assert store.summary("Anna")["punkti"] == 30
+    assert store.leaderboard().points("Anna") == 30
+    assert store.leaderboard().top(1) == [(1, "Anna", 30)]
+
+    store.leaderboard().save()
+    assert app.Leaderboard.open(store.backend).points("Anna") == 30
+
+
+def test_rebuilding_indexes_does_not_convert_profiles(data_dir):
+    store = new_session("eventlog")
+    for name in ("Anna", "Beate", "Cilda"):
+        app.create_new_user(store, name, f"{name.lower()}@example.com", "x")
+        app.add_achievement(store, name, "Pirmais", "", len(name))
+    store.add("Anna", "result_added", result(3))
+    store.flush(wait=True)
+    store.compact("Anna")      # старый формат: результаты в снимке
+    for path in data_dir.glob("*.idx"):
+        path.unlink()
+    before = sorted(p.name for p in data_dir.iterdir())
+
+    backend = app.SegmentBackend()
+    board = app.Leaderboard.open(backend)
+    directory = app.UserDirectory.open(backend, "segment")
+
+    assert board.top(3) == [(1, "Beate", 5), (1, "Cilda", 5), (3, "Anna", 4)]
+    assert directory.find("beate")["email"] == "beate@example.com"
+    assert sorted(p.name for p in data_dir.iterdir()) == before
+    assert not backend._meta and not backend._segments
+
+
+@pytest.mark.parametrize("name", ["segment", "sqlite"])
+def test_award_does_not_force_a_write(data_dir, name):
+    store = new_session(name)
+    app.create_new_user(store, "Anna", "anna@example.com", "x")
+    store.flush(wait=True)
+
+    store = new_session(name)
+    app.add_achievement(store, "Anna", "Pirmais", "", 10)
+    store._io.submit(lambda: None).result()     # индекс обновлён
+
+    assert store.leaderboard().points("Anna") == 10
+    assert "Anna" in store._pending            # запись ждёт своей очереди
+    store.flush(wait=True)
@@ -0,0 +1,34 @@
+import hashlib
+
+import app
+import migrate_sqlite
+from conftest import result
+
+
+def snapshot(path):
+    return {p.name: hashlib.sha256(p.read_bytes()).hexdigest() for p in path.iterdir()}
+
+
+def add_user(store, name, results):
+    app.create_new_user(store, name, f"{name.lower()}@example.com", "x")
+    store.add_many(name, "result_added", [result(v) for v in results])
+    store.flush(wait=True)
+
+
+def test_migration_reads_every_profile_without_touching_it(data_dir, tmp_path):
+    add_user(app.UserStore(backend=app.SegmentBackend()), "Anna", [1, 2, 3])
+    # профиль старого формата: только журнал событий, без <name>.json
+    add_user(app.UserStore(backend=app.EventLogBackend()), "Beate", [4, 5])
+    with open(data_dir / "Beate.events.jsonl", "ab") as f:
+        f.write(b'{"type": "result_added", "da')     # оборванная запись
+    before = snapshot(data_dir)
+    assert "Beate.json" not in before
+
+    migrate_sqlite.migrate(str(tmp_path / "users.db"))
+
+    assert snapshot(data_dir) == before
+    target = app.SqliteBackend(str(tmp_path / "users.db"))
+    assert sorted(a["username"] for a in target.accounts()) == ["Anna", "Beate"]
+    assert [r.value for r in target.rows("Anna", "rezultati")] == [3, 2, 1]
+    assert [r.value for r in target.rows("Beate", "rezultati")] == [5, 4]
+    assert target.summary("Beate")["stats"]["rezultati"] == 2
@@ -0,0 +1,32 @@
+import threading
+
+import app
+
+
+def test_case_variants_registered_concurrently_create_one_profile(data_dir):
+    store = app.UserStore()
+    names = ["Anna", "anna", "ANNA", "Anna"]
+    start = threading.Barrier(len(names))
+    created = []
+
+    def register(name):
+        start.wait()
+        created.append((name, app.create_new_user(store, name, "anna@example.com", "x")))
+
+    threads = [threading.Thread(target=register, args=(name,)) for name in names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.flush(wait=True)
+
+    winners = [name for name, ok in created if ok]
+    assert len(winners) == 1
+    assert app.list_usernames() == winners
+
+
+def test_taken_name_is_refused(data_dir):
+    store = app.UserStore()
+    assert app.create_new_user(store, "Anna", "anna@example.com", "x")
+    assert not app.create_new_user(store, "anna", "other@example.com", "y")
+    assert store.directory().find("ANNA")["email"] == "anna@example.com"
@@ -0,0 +1,55 @@
+from datetime import date, timedelta
+
+import app
+from conftest import result
+
+
+def streak_after(*days):
+    stats = app.new_stats()
+    for day in days:
+        record = result(1, datums=day.strftime(app.DATE_FMT) + " 10:00")
+        app.update_stats(stats, "result_added", app.as_model("rezultati", record))
+    return stats["streak"]
+
+
+def test_streak_counts_consecutive_days():
+    today = date.today()
+    streak = streak_after(*(today - timedelta(days=n) for n in (4, 3, 2, 1, 0)))
+    assert app.current_streak(streak) == 5
+    assert streak["best"] == 5
+
+
+def test_streak_survives_until_end_of_next_day():
+    yesterday = date.today() - timedelta(days=1)
+    assert app.current_streak(streak_after(yesterday - timedelta(days=1), yesterday)) == 2
+
+
+def test_broken_streak_reads_as_zero():
+    streak = streak_after(*(date(2025, 1, d) for d in range(1, 6)))
+    assert streak["current"] == 5           # на день последнего результата
+    assert app.current_streak(streak) == 0
+    assert app.current_streak(streak, today=date(2025, 1, 6)) == 5
+    assert streak["best"] == 5
+
+
+def test_no_results_no_streak():
+    assert app.current_streak(app.new_stats()["streak"]) == 0
+
+
+def test_non_finite_values_are_rejected():
+    for value in ("inf", "-inf", "nan", "1e999"):
+        assert app.check_result(result(value)) == "Rezultātam jābūt skaitlim!"
+    assert app.check_result(result("5.5")) is None
+
+
+def test_stats_survive_sum_stored_as_null(data_dir):
+    # orjson записал inf как null; следующий результат не должен падать
+    store = app.UserStore(backend=app.EventLogBackend())
+    app.create_new_user(store, "Anna", "anna@example.com", "x")
+    store.add("Anna", "result_added", result("inf"))
+    store.add("Anna", "result_added", result(5))
+    store.flush(wait=True)
+    stats = store.summary("Anna")["stats"]
+    stats["sports"]["Skriešana"]["sum"] = None
+    app.update_stats(stats, "result_added", app.as_model("rezultati", result(2)))
+    assert stats["sports"]["Skriešana"] == {"count": 3, "sum": 2.0, "best": 5.0}
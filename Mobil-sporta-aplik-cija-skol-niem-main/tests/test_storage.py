@@ -0,0 +1,235 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import app
+from conftest import result
+
+OLD = "01.01.2020 10:00"
+
+
+def fill(backend, values, datums="01.03.2026 10:00"):
+    store = app.UserStore(backend=backend)
+    app.create_new_user(store, "Anna", "anna@example.com", "x")
+    store.add_many("Anna", "result_added", [result(v, datums=datums) for v in values])
+    store.flush(wait=True)
+    return store
+
+
+def reopen(backend_cls=app.SegmentBackend):
+    # Новый процесс после сбоя: кэши пусты, всё читается с диска
+    return app.UserStore(backend=backend_cls())
+
+
+def values(store):
+    return [r.value for r in store.rows("Anna", "rezultati")][::-1]
+
+
+@pytest.mark.parametrize("torn", [b'{"type": "result_added", "da', b"\x00\x00garbage\n"])
+def test_torn_event_log_tail_is_cut(data_dir, torn):
+    fill(app.EventLogBackend(), [1, 2, 3])
+    log = data_dir / "Anna.events.jsonl"
+    size = log.stat().st_size
+    with open(log, "ab") as f:
+        f.write(torn)
+
+    store = reopen(app.EventLogBackend)
+    assert values(store) == [1, 2, 3]
+    assert store.summary("Anna")["stats"]["rezultati"] == 3
+    assert log.stat().st_size == size
+
+    store.add("Anna", "result_added", result(4))
+    store.flush(wait=True)
+    assert values(reopen(app.EventLogBackend)) == [1, 2, 3, 4]
+
+
+def test_unfinished_atomic_writes_are_removed(data_dir):
+    store = fill(app.SegmentBackend(), [1, 2, 3])
+    store.compact("Anna")
+    profile = (data_dir / "Anna.json").read_bytes()
+    (data_dir / "Anna.json.tmp").write_bytes(profile[:len(profile) // 2])
+    (data_dir / "Anna.results.idx.tmp").write_bytes(b"\x01")
+
+    app.recover_data_dir()
+
+    assert not [p for p in os.listdir(data_dir) if p.endswith(".tmp")]
+    store = reopen()
+    assert values(store) == [1, 2, 3]
+    assert store.summary("Anna")["stats"]["rezultati"] == 3
+
+
+def test_torn_segment_append_is_cut(data_dir):
+    fill(app.SegmentBackend(), [1, 2, 3])
+    files = {p: (data_dir / f"Anna.results{p}") for p in (".dat", ".idx", ".sports")}
+    sizes = {p: f.stat().st_size for p, f in files.items()}
+    # данные дописаны, индекс — нет; вид спорта оборван посреди строки
+    for p, torn in ((".dat", b'{"sport": "Pel'), (".idx", b"\x07" * 5), (".sports", b'"Pel')):
+        with open(files[p], "ab") as f:
+            f.write(torn)
+
+    store = reopen()
+    assert values(store) == [1, 2, 3]
+    assert store.summary("Anna")["stats"]["rezultati"] == 3
+    assert {p: f.stat().st_size for p, f in files.items()} == sizes
+
+    store.add("Anna", "result_added", result(4, sport="Peldēšana"))
+    store.flush(wait=True)
+    store = reopen()
+    assert values(store) == [1, 2, 3, 4]
+    assert [r.value for r in store.find_results("Anna", sport="Peldēšana")] == [4]
+
+
+def test_drop_keeps_data_for_the_index_if_interrupted(data_dir, monkeypatch):
+    fill(app.SegmentBackend(), [1, 2, 3, 4, 5])
+    segment = app.ResultSegment("Anna")
+    write_atomic = app.write_atomic
+
+    def crash_on_data(path, raw):
+        if path.endswith(".results.dat"):
+            raise OSError("сбой между индексом и данными")
+        write_atomic(path, raw)
+
+    with monkeypatch.context() as m:
+        m.setattr(app, "write_atomic", crash_on_data)
+        with pytest.raises(OSError):
+            segment.drop(2)
+
+    # индекс уже новый, данные — прежние: все его записи читаются
+    segment = app.ResultSegment("Anna")
+    assert (segment.base, segment.count) == (2, 3)
+    assert [r.value for r in segment.records()] == [3, 4, 5]
+    segment.close()
+
+
+def test_interrupted_archive_drop_is_finished_on_load(data_dir, monkeypatch):
+    monkeypatch.setattr(app, "ARCHIVE_MIN", 1)
+    store = fill(app.SegmentBackend(), [1, 2, 3], datums=OLD)
+    now = datetime.now().strftime(app.DATETIME_FMT)
+    store.add_many("Anna", "result_added", [result(v, datums=now) for v in (4, 5)])
+    store.flush(wait=True)
+
+    def crash(segment, n):
+        raise OSError("сбой после события records_archived")
+
+    with monkeypatch.context() as m:
+        m.setattr(app.ResultSegment, "drop", crash)
+        with pytest.raises(OSError):
+            app.archive_old(store, "Anna")
+
+    # событие в логе, сегмент ещё со старыми записями
+    segment = app.ResultSegment("Anna")
+    assert (segment.base, segment.count) == (0, 5)
+    segment.close()
+
+    store = reopen()
+    summary = store.summary("Anna")
+    assert summary["stats"]["archived"]["rezultati"] == 3
+    assert summary["stats"]["rezultati"] == 5
+    assert store.backend.count("Anna", "rezultati") == 2
+    assert values(store) == [1, 2, 3, 4, 5]     # архив + живой хвост
+    segment = store.backend.segment("Anna")
+    assert (segment.base, segment.count) == (3, 2)
+
+
+def failing_once(monkeypatch, owner, name):
+    # Первый вызов owner.name падает, как при полном диске
+    original = getattr(owner, name)
+    calls = []
+
+    def wrapper(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise OSError("нет места на диске")
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(owner, name, wrapper)
+
+
+@pytest.mark.parametrize("owner, name", [(app.EventLogBackend, "_append_log"),
+                                         (app.ResultSegment, "append")])
+def test_failed_write_is_retried_without_duplicates(data_dir, monkeypatch, owner, name):
+    store = fill(app.SegmentBackend(), [1, 2])
+    failing_once(monkeypatch, owner, name)
+    # результаты уходят в сегмент, задание — в лог; одна из записей не удалась
+    store.add("Anna", "result_added", result(3))
+    store.add("Anna", "challenge_created", {
+        "title": "10 km", "sport": "Skriešana", "description": "", "target": "10",
+        "unit": "km", "deadline": "", "datums": "01.03.2026 10:00"})
+    store.flush(wait=True)
+    store.flush(wait=True)      # повтор через WRITE_RETRY
+
+    store = reopen()
+    assert values(store) == [1, 2, 3]
+    assert store.count("Anna", "izaicinajumi") == 1
+    assert store.summary("Anna")["stats"]["rezultati"] == 3
+
+
+def test_archive_is_not_repeated_after_a_failed_drop(data_dir, monkeypatch):
+    monkeypatch.setattr(app, "ARCHIVE_MIN", 1)
+    store = fill(app.SegmentBackend(), [1, 2, 3], datums=OLD)
+    now = datetime.now().strftime(app.DATETIME_FMT)
+    store.add_many("Anna", "result_added", [result(v, datums=now) for v in (4, 5)])
+    store.flush(wait=True)
+    failing_once(monkeypatch, app.ResultSegment, "drop")
+
+    app.archive_old(store, "Anna")
+    store.flush(wait=True)
+
+    store = reopen()
+    assert store.summary("Anna")["stats"]["archived"]["rezultati"] == 3
+    assert store.backend.count("Anna", "rezultati") == 2
+    assert values(store) == [1, 2, 3, 4, 5]
+
+
+def test_add_does_not_wait_for_a_backend_write(data_dir, monkeypatch):
+    store = fill(app.EventLogBackend(), [1])
+    writing, release = threading.Event(), threading.Event()
+    write = app.EventLogBackend.write
+
+    def slow_write(self, username, data, events):
+        writing.set()
+        release.wait(5)     # fsync или сжатие снимка
+        write(self, username, data, events)
+
+    monkeypatch.setattr(app.EventLogBackend, "write", slow_write)
+    store.add("Anna", "result_added", result(2))
+    store.flush()
+    assert writing.wait(5)
+
+    start = time.perf_counter()
+    store.add("Anna", "result_added", result(3))
+    assert time.perf_counter() - start < 0.5
+    assert store._busy("Anna")              # пачка в пути ещё не на диске
+    assert values(store) == [1, 2, 3]
+
+    release.set()
+    store.flush(wait=True)
+    assert values(reopen(app.EventLogBackend)) == [1, 2, 3]
+
+
+@pytest.mark.parametrize("backend_cls", [app.EventLogBackend, app.SegmentBackend])
+def test_archive_reads_only_the_old_head_of_the_list(data_dir, monkeypatch, backend_cls):
+    monkeypatch.setattr(app, "ARCHIVE_MIN", 1)
+    monkeypatch.setattr(app, "TAIL_PAGE", 2)
+    store = fill(backend_cls(), [1, 2, 3], datums=OLD)
+    now = datetime.now().strftime(app.DATETIME_FMT)
+    store.add_many("Anna", "result_added", [result(v, datums=now) for v in range(4, 30)])
+    store.flush(wait=True)
+    pages = []
+    read = app.UserStore._slice
+
+    def slice_(self, username, key, first, stop):
+        if key == "rezultati":
+            pages.append((first, stop))
+        return read(self, username, key, first, stop)
+
+    monkeypatch.setattr(app.UserStore, "_slice", slice_)
+    assert app.archive_old(store, "Anna") == {"rezultati": 3}
+    # страница с первой новой записью — последняя прочитанная
+    assert max(stop for _, stop in pages) <= 4
+    store.flush(wait=True)
+    assert values(reopen(backend_cls)) == [1, 2, 3] + list(range(4, 30))
+    assert store.summary("Anna")["stats"]["archived"]["rezultati"] == 3
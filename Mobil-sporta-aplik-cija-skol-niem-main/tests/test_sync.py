@@ -0,0 +1,147 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+import app
+import sync_server
+from conftest import result
+
+
+class Device:
+    # Отдельный user_data и свой store — как второй телефон того же пользователя
+    def __init__(self, path, url, monkeypatch):
+        self.path, self.monkeypatch = str(path), monkeypatch
+        with self.active():
+            self.store = app.UserStore()
+            self.client = app.SyncClient(self.store, url)
+            app.create_new_user(self.store, "Anna", "anna@example.com", "x")
+            self.store.flush(wait=True)
+
+    @contextmanager
+    def active(self):
+        self.monkeypatch.setattr(app, "DATA_DIR", self.path)
+        yield
+
+    def add(self, *records):
+        with self.active():
+            self.store.add_many("Anna", "result_added", records)
+            self.store.flush(wait=True)
+
+    def sync(self):
+        with self.active():
+            return self.client.sync("Anna")
+
+    def values(self):
+        with self.active():
+            return sorted(r.value for r in self.store.rows("Anna", "rezultati"))
+
+    def state(self):
+        with self.active():
+            return self.client.load_state("Anna")
+
+
+@pytest.fixture
+def server():
+    srv = sync_server.make_server(0)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def devices(tmp_path, server, monkeypatch):
+    monkeypatch.setattr(app, "SYNC_BACKOFF", 0)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    return (Device(tmp_path / "a", url, monkeypatch),
+            Device(tmp_path / "b", url, monkeypatch))
+
+
+def fail_requests(server, status, times):
+    # Первые times запросов сервер отвечает status, дальше — как обычно
+    handler = server.RequestHandlerClass
+    ok, left = handler.do_POST, [times]
+
+    def do_POST(self):
+        if left[0] > 0:
+            left[0] -= 1
+            self.send_error(status)
+            return
+        ok(self)
+    handler.do_POST = do_POST
+    return left
+
+
+def test_delta_push_and_pull(devices):
+    a, b = devices
+    a.add(result(1), result(2), result(3))
+    assert a.sync() == (3, 0)
+    assert a.sync() == (0, 0)          # уже отправленное не шлётся снова
+    assert b.sync() == (0, 3)
+    assert b.values() == [1.0, 2.0, 3.0]
+
+    b.add(result(4))
+    assert b.sync() == (1, 0)
+    assert a.sync() == (0, 1)
+    assert a.values() == b.values() == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_pulled_records_are_not_pushed_back(devices, server):
+    a, b = devices
+    a.add(result(1), result(2))
+    a.sync()
+    assert b.sync() == (0, 2)
+    assert len(b.state()["pulled"]) == 2
+    # полученные записи теперь в конце списка B, но назад не уходят
+    assert b.sync() == (0, 0)
+    assert b.state()["pulled"] == []
+    known = server.RequestHandlerClass.store.users["Anna"]
+    assert len(known) == 2
+    assert all(r["devices"] == [a.state()["device"]] for r in known.values())
+
+
+def test_retry_on_server_error(devices, server):
+    a, _ = devices
+    a.add(result(1))
+    left = fail_requests(server, 503, app.SYNC_RETRIES - 1)
+    assert a.sync() == (1, 0)
+    assert left[0] == 0
+
+
+def test_client_error_is_not_retried(devices, server):
+    a, _ = devices
+    a.add(result(1))
+    left = fail_requests(server, 403, app.SYNC_RETRIES)
+    with pytest.raises(app.SyncError):
+        a.sync()
+    assert left[0] == app.SYNC_RETRIES - 1
+    assert a.state()["pushed"]["rezultati"] == 0
+
+
+def test_resume_after_failed_batch(devices, server, monkeypatch):
+    a, b = devices
+    monkeypatch.setattr(app, "SYNC_BATCH", 2)
+    a.add(*[result(i) for i in range(5)])
+    # первая пачка принята, вторая не проходит ни с одной попытки
+    ok = server.RequestHandlerClass.do_POST
+    calls = []
+
+    def do_POST(self):
+        calls.append(1)
+        if len(calls) > 1:
+            self.send_error(502)
+            return
+        ok(self)
+    server.RequestHandlerClass.do_POST = do_POST
+    with pytest.raises(app.SyncError):
+        a.sync()
+    assert len(calls) == 1 + app.SYNC_RETRIES
+    assert a.state()["pushed"]["rezultati"] == 2
+
+    server.RequestHandlerClass.do_POST = ok
+    assert a.sync() == (3, 0)          # только то, что не дошло
+    assert len(server.RequestHandlerClass.store.users["Anna"]) == 5
+    assert b.sync() == (0, 5)
+    assert b.values() == [0.0, 1.0, 2.0, 3.0, 4.0]